@@ -1,7 +1,7 @@
 from fyyur import create_app
 
 
-app = create_app()
+app = create_app('development')
 
 # Default port:
 if __name__ == '__main__':
@@ -0,0 +1,20 @@
+"""ASGI entry point with the async read path: uvicorn asgi:app --workers 4
+
+Flask is a WSGI framework, so uvicorn runs it in a pool of WEB_THREADS
+threads per worker. The read pages are async views whose queries share
+one asyncpg pool per worker (see fyyur/async_reads.py).
+"""
+import os
+
+# must be set before the config module is imported
+os.environ.setdefault('ASYNC_READS', '1')
+
+from uvicorn.middleware.wsgi import WSGIMiddleware  # noqa: E402
+
+from fyyur import create_app  # noqa: E402
+from fyyur.config import ProductionConfig  # noqa: E402
+
+
+app = WSGIMiddleware(
+    create_app(os.environ.get('FYYUR_CONFIG', 'production')),
+    workers=ProductionConfig.WEB_THREADS)
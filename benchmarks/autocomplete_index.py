@@ -0,0 +1,51 @@
+"""Build time, memory and lookup latency of the autocomplete prefix index.
+
+Usage: python benchmarks/autocomplete_index.py [number_of_names]
+"""
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+from fyyur.autocomplete import PrefixIndex
+
+WORDS = ['the', 'jazz', 'blue', 'note', 'hall', 'club', 'room', 'house',
+         'cafe', 'garden', 'park', 'theatre', 'lounge', 'bar', 'arena']
+
+
+def synthetic_names(count, seed=7):
+    rng = random.Random(seed)
+    for entity_id in range(1, count + 1):
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        suffix = ''.join(rng.choices(string.ascii_lowercase, k=4))
+        yield entity_id, ' '.join(words + [suffix]).title()
+
+
+def main(count):
+    rows = list(synthetic_names(count))
+    index = PrefixIndex(lambda: rows, refresh_after=float('inf'))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.build()
+    build_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(11)
+    prefixes = [name.split()[-1][:rng.randint(1, 4)] for _, name in
+                rng.sample(rows, min(len(rows), 10000))]
+    started = time.perf_counter()
+    for prefix in prefixes:
+        index.search(prefix)
+    lookup_us = (time.perf_counter() - started) / len(prefixes) * 1e6
+
+    print(f'names:          {count}')
+    print(f'build time:     {build_seconds * 1000:.1f} ms')
+    print(f'peak memory:    {peak / 2 ** 20:.1f} MiB')
+    print(f'mean lookup:    {lookup_us:.1f} us')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
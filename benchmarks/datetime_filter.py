@@ -0,0 +1,62 @@
+"""Render a 1,000-show list with the old and the new `datetime` filter.
+
+The old filter parsed a strftime'd string back with dateutil and built the
+babel pattern on every call; the new one formats datetime objects with a
+memoized pattern and locale.
+
+Usage: python benchmarks/datetime_filter.py [shows] [rounds]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from jinja2 import Environment
+
+from fyyur.filters import format_datetime
+
+TEMPLATE = """{% for show in shows %}
+<h4>{{ show.start_time|datetime('full') }}</h4>
+{% endfor %}"""
+
+
+def legacy_format_datetime(value, format='medium'):
+    if isinstance(value, str):
+        date = dateutil.parser.parse(value)
+        if format == 'full':
+            format = "EEEE MMMM, d, y 'at' h:mma"
+        elif format == 'medium':
+            format = "EE MM, dd, y h:mma"
+        return babel.dates.format_datetime(date, format, locale='en')
+
+
+def render_time(filter_function, shows, rounds):
+    environment = Environment()
+    environment.filters['datetime'] = filter_function
+    template = environment.from_string(TEMPLATE)
+    template.render(shows=shows)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        template.render(shows=shows)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main(count, rounds):
+    start = datetime(2022, 6, 1, 20, 0)
+    times = [start + timedelta(hours=7 * number) for number in range(count)]
+    legacy = render_time(
+        legacy_format_datetime,
+        [{'start_time': value.strftime('%Y-%m-%d %H:%M:%S')}
+         for value in times], rounds)
+    current = render_time(
+        format_datetime, [{'start_time': value} for value in times], rounds)
+
+    print(f'{count} shows, mean of {rounds} renders')
+    print(f'legacy filter:  {legacy:.1f} ms')
+    print(f'current filter: {current:.1f} ms ({legacy / current:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,159 @@
+"""Seeded synthetic data for benchmarks.
+
+Loads venues, artists and shows straight into the configured database with
+COPY, then rebuilds the show counters. Point DATABASE_URL at a throwaway
+Postgres (for example a disposable docker container), never at real data.
+
+Usage:
+    python benchmarks/generate.py --venues 10000 --artists 50000 \
+        --shows 1000000 --cities 200 --genres 8 --seed 1
+"""
+import argparse
+import io
+import random
+import string
+import time
+from datetime import datetime, timedelta
+
+from fyyur import counters, create_app, db
+from fyyur.venues.forms import VenueForm
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+STATES = [value for value, _ in VenueForm.state.kwargs['choices']]
+COPY_BATCH = 50000
+
+
+def _cities(rng, count):
+    return [(''.join(rng.choices(string.ascii_lowercase, k=7)).title(),
+             rng.choice(STATES)) for _ in range(count)]
+
+
+def _array(values):
+    return '{' + ','.join(f'"{value}"' for value in values) + '}'
+
+
+def _copy(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write('\t'.join(str(value) for value in row) + '\n')
+        count += 1
+        if count % COPY_BATCH == 0:
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY "{table}" ({", ".join(columns)}) FROM STDIN', buffer)
+            buffer = io.StringIO()
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY "{table}" ({", ".join(columns)}) FROM STDIN', buffer)
+    return count
+
+
+def venue_rows(rng, count, cities, genres):
+    for number in range(1, count + 1):
+        city, state = rng.choice(cities)
+        yield (f'Venue {number:07d}', city, state, f'{number} Main Street',
+               f'{rng.randrange(10 ** 9, 10 ** 10)}',
+               f'https://img.example.com/venues/{number}.jpg',
+               f'https://facebook.com/venue{number}',
+               _array(rng.sample(genres, rng.randint(1, min(3, len(genres))))),
+               rng.choice(['t', 'f']))
+
+
+def artist_rows(rng, count, cities, genres):
+    for number in range(1, count + 1):
+        city, state = rng.choice(cities)
+        yield (f'Artist {number:07d}', city, state,
+               f'{rng.randrange(10 ** 9, 10 ** 10)}',
+               _array(rng.sample(genres, rng.randint(1, min(3, len(genres))))),
+               f'https://img.example.com/artists/{number}.jpg',
+               rng.choice(['t', 'f']))
+
+
+def show_rows(rng, count, venue_ids, artist_ids, span_days, duration):
+    # shows spread evenly around now, half of them already past. The span
+    # is cut into slots of duration plus an hour and a venue never gets
+    # the same slot twice, so no two shows at a venue overlap (the
+    # ex_Show_venue_booking constraint would reject the COPY)
+    slot_minutes = duration + 60
+    slots = span_days * 24 * 60 // slot_minutes
+    if count > slots * len(venue_ids):
+        raise SystemExit(f'{count} shows do not fit in {slots} slots at '
+                         f'each of {len(venue_ids)} venues; raise '
+                         '--span-days or --venues')
+
+    start = datetime.now().replace(microsecond=0) \
+        - timedelta(days=span_days / 2)
+    booked = {}
+    open_venues = list(venue_ids)
+    for _ in range(count):
+        while True:
+            position = rng.randrange(len(open_venues))
+            venue_id = open_venues[position]
+            venue_slots = booked.setdefault(venue_id, set())
+            if len(venue_slots) < slots:
+                break
+            # the venue is fully booked
+            open_venues[position] = open_venues[-1]
+            open_venues.pop()
+        slot = rng.randrange(slots)
+        while slot in venue_slots:
+            slot = rng.randrange(slots)
+        venue_slots.add(slot)
+        offset = timedelta(minutes=slot * slot_minutes + rng.randrange(60))
+        yield (venue_id, rng.choice(artist_ids), start + offset, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--genres', type=int, default=len(GENRES))
+    parser.add_argument('--span-days', type=int, default=730)
+    parser.add_argument('--duration', type=int, default=120,
+                        help='Length of every show in minutes.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cities = _cities(rng, args.cities)
+    genres = GENRES[:args.genres]
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            started = time.perf_counter()
+            _copy(cursor, 'Venue',
+                  ['name', 'city', 'state', 'address', 'phone', 'image_link',
+                   'facebook_link', 'genres', 'seeking_talent'],
+                  venue_rows(rng, args.venues, cities, genres))
+            _copy(cursor, 'Artist',
+                  ['name', 'city', 'state', 'phone', 'genres', 'image_link',
+                   'seeking_venue'],
+                  artist_rows(rng, args.artists, cities, genres))
+
+            cursor.execute('SELECT id FROM "Venue"')
+            venue_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT id FROM "Artist"')
+            artist_ids = [row[0] for row in cursor.fetchall()]
+            _copy(cursor, 'Show',
+                  ['venue_id', 'artist_id', 'start_time', 'duration_minutes'],
+                  show_rows(rng, args.shows, venue_ids, artist_ids,
+                            args.span_days, args.duration))
+            cursor.execute('ANALYZE')
+            connection.commit()
+        finally:
+            connection.close()
+
+        counters.rebuild()
+        print(f'loaded {args.venues} venues, {args.artists} artists and '
+              f'{args.shows} shows in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Load test the production entry point at increasing worker counts.
+
+For every worker count the server is started (gunicorn with
+gunicorn.conf.py and wsgi:app, or uvicorn with asgi:app and the async read
+path), then client processes hammer the read routes over keep-alive
+connections for --duration seconds. Throughput should grow roughly with
+the worker count until it reaches the number of cores (or the database
+becomes the limit). Run benchmarks/generate.py first.
+
+To compare the sync and async read paths, run both servers with the
+response and fragment caches off, so every request reaches the database:
+
+    python benchmarks/load.py --server gunicorn --no-cache
+    python benchmarks/load.py --server uvicorn --no-cache
+
+Usage:
+    python benchmarks/load.py --workers 1,2,4,8 --duration 15 \
+        --output load.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ('/', '/venues/', '/artists/', '/shows/', '/shows/?when=upcoming',
+         '/venues/1', '/artists/1')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('the server exited during startup')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'the server did not listen on {port} in {timeout}s')
+
+
+def _connection_loop(port, deadline, results):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = []
+    errors = 0
+    index = 0
+    while time.monotonic() < deadline:
+        path = PATHS[index % len(PATHS)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    results.append((latencies, errors))
+
+
+def _client(args):
+    # one client process with `connections` concurrent keep-alive clients
+    port, connections, duration = args
+    deadline = time.monotonic() + duration
+    results = []
+    threads = [threading.Thread(target=_connection_loop,
+                                args=(port, deadline, results))
+               for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = [latency for sample, _ in results for latency in sample]
+    return latencies, sum(errors for _, errors in results)
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def _command(server, workers, threads, port):
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', '--workers', str(workers),
+                '--host', '127.0.0.1', '--port', str(port),
+                '--no-access-log', 'asgi:app']
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--workers', str(workers), '--threads', str(threads),
+            '--bind', f'127.0.0.1:{port}', '--access-logfile', '/dev/null',
+            'wsgi:app']
+
+
+def measure(workers, args):
+    port = _free_port()
+    env = dict(os.environ, FYYUR_CONFIG='production',
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'load-test'),
+               WEB_THREADS=str(args.threads))
+    if args.no_cache:
+        env.update(RESPONSE_CACHE_ENABLED='0', FRAGMENT_CACHE_ENABLED='0')
+    server = subprocess.Popen(
+        _command(args.server, workers, args.threads, port), cwd=ROOT, env=env)
+    try:
+        _wait_until_up(port, server)
+        # let every worker build its indexes and caches before measuring
+        with multiprocessing.Pool(args.clients) as pool:
+            pool.map(_client, [(port, args.connections, 2)] * args.clients)
+            started = time.monotonic()
+            results = pool.map(
+                _client,
+                [(port, args.connections, args.duration)] * args.clients)
+            elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for sample, _ in results for latency in sample)
+    return {
+        'server': args.server,
+        'workers': workers,
+        'threads': args.threads,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2)
+        if latencies else 0,
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = [count for count in sorted({1, 2, 4, cores})
+                       if count <= cores]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'),
+                        default='gunicorn',
+                        help='gunicorn runs the sync views, uvicorn the '
+                             'async read path.')
+    parser.add_argument('--workers', default=','.join(
+        str(count) for count in default_workers),
+        help='Comma separated worker counts to measure.')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Threads per worker.')
+    parser.add_argument('--clients', type=int, default=max(1, cores // 2),
+                        help='Client processes generating load.')
+    parser.add_argument('--connections', type=int, default=8,
+                        help='Concurrent connections per client process.')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds of load per worker count.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Turn the response and fragment caches off.')
+    parser.add_argument('--output', help='Write the results here as JSON.')
+    args = parser.parse_args()
+
+    rows = []
+    for workers in (int(count) for count in args.workers.split(',')):
+        row = measure(workers, args)
+        rows.append(row)
+        row['speedup'] = round(
+            row['requests_per_second'] / rows[0]['requests_per_second'], 2) \
+            if rows[0]['requests_per_second'] else 0
+
+    print(f'{args.server}, {cores} cores, {args.threads} threads per worker, '
+          f'{args.clients}x{args.connections} connections')
+    print(f'{"workers":>8} {"req/s":>10} {"speedup":>8} {"p50 ms":>8} '
+          f'{"p99 ms":>8} {"errors":>7}')
+    for row in rows:
+        print(f'{row["workers"]:>8} {row["requests_per_second"]:>10} '
+              f'{row["speedup"]:>8} {row["p50_ms"]:>8} {row["p99_ms"]:>8} '
+              f'{row["errors"]:>7}')
+
+    if args.output:
+        with open(args.output, 'w') as target:
+            json.dump({'server': args.server, 'cores': cores,
+                       'cache': not args.no_cache, 'results': rows}, target, indent=2)
+
+
+if __name__ == '__main__':
+    main()
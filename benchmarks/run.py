@@ -0,0 +1,142 @@
+"""Drive every read route through the Flask test client and report latency
+percentiles, SQL query counts and peak Python memory per route.
+
+Run benchmarks/generate.py first. Results are written as JSON; pass a
+previous result file with --compare to print the change per route.
+
+Usage:
+    python benchmarks/run.py --requests 50 --output after.json \
+        --compare before.json
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from fyyur import create_app, db
+from fyyur.models import Artist, Venue
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _routes(app):
+    with app.app_context():
+        venue = db.session.query(Venue.id, Venue.name).order_by(
+            Venue.num_upcoming_shows.desc()).first()
+        artist = db.session.query(Artist.id, Artist.name).order_by(
+            Artist.num_upcoming_shows.desc()).first()
+        first_venue = db.session.query(func.min(Venue.id)).scalar()
+    prefix = venue.name[:4]
+    return {
+        'home': ('GET', '/', None),
+        'all_venues': ('GET', '/venues/', None),
+        'all_artists': ('GET', '/artists/', None),
+        'all_shows': ('GET', '/shows/', None),
+        'upcoming_shows': ('GET', '/shows/?when=upcoming', None),
+        'show_venue': ('GET', f'/venues/{venue.id}', None),
+        'show_venue_first': ('GET', f'/venues/{first_venue}', None),
+        'show_artist': ('GET', f'/artists/{artist.id}', None),
+        'search_venues': ('POST', '/venues/search',
+                          {'search_term': prefix}),
+        'search_artists': ('POST', '/artists/search',
+                           {'search_term': artist.name[:6]}),
+        'autocomplete_venues': ('GET', f'/venues/autocomplete?q={prefix}',
+                                None),
+        'api_venues_page': ('GET', '/api/venues?limit=500', None),
+    }
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(client, counter, method, path, data, requests):
+    latencies = []
+    queries = []
+    tracemalloc.start()
+    for _ in range(requests):
+        before = counter.count
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+        if response.status_code != 200:
+            raise SystemExit(f'{method} {path} returned '
+                             f'{response.status_code}')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'requests': requests,
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'queries': max(queries),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline):
+    print(f'{"route":24} {"p50 ms":>16} {"p95 ms":>16} {"queries":>12}')
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        print(f'{name:24} '
+              f'{old["p50_ms"]:>7} -> {result["p50_ms"]:<7}'
+              f'{old["p95_ms"]:>7} -> {result["p95_ms"]:<7}'
+              f'{old["queries"]:>5} -> {result["queries"]:<5}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--cache', action='store_true',
+                        help='Leave the response cache on.')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare')
+    parser.add_argument('routes', nargs='*',
+                        help='Only run these routes (default: all).')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config['RESPONSE_CACHE_ENABLED'] = args.cache
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    counter = QueryCounter()
+
+    results = {}
+    for name, (method, path, data) in _routes(app).items():
+        if args.routes and name not in args.routes:
+            continue
+        for _ in range(args.warmup):
+            client.open(path, method=method, data=data)
+        results[name] = measure(client, counter, method, path, data,
+                                args.requests)
+        print(f'{name:24} {json.dumps(results[name])}')
+
+    with open(args.output, 'w') as target:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, target, indent=2)
+
+    if args.compare:
+        with open(args.compare) as source:
+            compare(results, json.load(source)['results'])
+
+
+if __name__ == '__main__':
+    main()
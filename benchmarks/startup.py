@@ -0,0 +1,87 @@
+"""Measure create_app() wall time and the modules it imports, and exit
+non-zero when startup is over the budget in startup_budget.json.
+
+Every sample runs in a fresh interpreter so nothing is already imported.
+The module count and the forbidden modules (libraries that must only load
+when used) are deterministic and make a reliable CI gate; the time budget
+is deliberately loose, since CI machines vary.
+
+Usage: python benchmarks/startup.py [--runs 7] [--config production]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(ROOT, 'benchmarks', 'startup_budget.json')
+
+PROBE = '''
+import json, sys, time
+before = set(sys.modules)
+started = time.perf_counter()
+from fyyur import create_app
+create_app(sys.argv[1])
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000,
+                  "modules": sorted(set(sys.modules) - before)}))
+'''
+
+
+def sample(config_name, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT,
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'startup-benchmark'))
+    # the flask command loads the CLI-only modules on purpose
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, config_name], cwd=workdir, env=env,
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--config', default='production',
+                        help='Profile passed to create_app().')
+    parser.add_argument('--budget', default=BUDGET)
+    args = parser.parse_args()
+
+    with open(args.budget) as source:
+        budget = json.load(source)
+
+    # the production profile writes error.log into the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        samples = [sample(args.config, workdir) for _ in range(args.runs)]
+
+    times = sorted(result['ms'] for result in samples)
+    modules = samples[-1]['modules']
+    median = statistics.median(times)
+    forbidden = sorted(
+        {name.split('.')[0] for name in modules}
+        & set(budget['forbidden_modules']))
+
+    print(f'create_app(): median {median:.0f} ms, min {times[0]:.0f} ms '
+          f'over {args.runs} runs (budget {budget["max_ms"]} ms)')
+    print(f'modules imported: {len(modules)} '
+          f'(budget {budget["max_modules"]})')
+
+    failures = []
+    if median > budget['max_ms']:
+        failures.append(f'startup took {median:.0f} ms')
+    if len(modules) > budget['max_modules']:
+        failures.append(f'{len(modules)} modules imported')
+    if forbidden:
+        failures.append('imported at startup: ' + ', '.join(forbidden))
+
+    for failure in failures:
+        print(f'FAIL  {failure}')
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,111 @@
+import os
 from flask import Flask
-import dateutil.parser
-import babel
-from flask_moment import Moment
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.local import LocalProxy
 import logging
 from logging import Formatter, FileHandler
-from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
-from fyyur.config import Config
+from fyyur.config import configs
+from fyyur.database import RoutingSQLAlchemy
 
 
-db = SQLAlchemy()
-moment = Moment()
-migrate = Migrate()
+db = RoutingSQLAlchemy()
 
 
-def create_app():
+def _load_moment():
+    # flask_moment imports distutils, and with it setuptools, which takes
+    # longer than the rest of startup together; it is loaded the first time
+    # a template actually uses `moment`
+    from flask_moment import _moment
+    return _moment
+
+
+moment = LocalProxy(_load_moment)
+
+
+def create_app(config_name=None):
+    """Build the app with the 'development' or 'production' profile,
+    FYYUR_CONFIG or 'development' when no name is given."""
+    config_name = config_name or os.environ.get('FYYUR_CONFIG', 'development')
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(configs[config_name])
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError(
+            f'SECRET_KEY must be set in the environment for the '
+            f'{config_name} profile')
 
     db.init_app(app)
-    moment.init_app(app)
-    migrate.init_app(app, db)
+    app.extensions['moment'] = moment
+    app.context_processor(lambda: {'moment': moment})
+
+    from fyyur import (
+        assets, autocomplete, cache, facets, instrumentation, jobs)
+    assets.init_app(app)
+    autocomplete.init_app(app)
+    cache.init_app(app)
+    facets.init_app(app)
+    instrumentation.init_app(app)
+    jobs.init_app(app)
 
     from fyyur.venues.routes import venues
     from fyyur.shows.routes import shows
     from fyyur.artists.routes import artists
     from fyyur.home.routes import home
     from fyyur.errors.errors import errors
+    from fyyur.admin.routes import admin
+    from fyyur.api.routes import api
 
     app.register_blueprint(home)
     app.register_blueprint(venues)
     app.register_blueprint(artists)
     app.register_blueprint(shows)
     app.register_blueprint(errors)
+    app.register_blueprint(admin)
+    app.register_blueprint(api)
+
+    if app.config['ASYNC_READS']:
+        from fyyur import async_reads
+        async_reads.init_app(app)
+
+    # Migration tooling (alembic) and the maintenance commands are only
+    # reachable from the `flask` command, so web workers never import them.
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+        from fyyur.commands import (
+            db_cli,
+            counters_cli,
+            jobs_cli,
+            import_command,
+            export_command,
+            purge_command,
+            compile_templates_command,
+            build_assets_command
+        )
+        app.cli.add_command(db_cli)
+        app.cli.add_command(counters_cli)
+        app.cli.add_command(jobs_cli)
+        app.cli.add_command(import_command)
+        app.cli.add_command(export_command)
+        app.cli.add_command(purge_command)
+        app.cli.add_command(compile_templates_command)
+        app.cli.add_command(build_assets_command)
 
 
     #----------------------------------------------------------------------------#
     # Filters.
     #----------------------------------------------------------------------------#
 
-    def format_datetime(value, format='medium'):
-        if isinstance(value, str):
-            date = dateutil.parser.parse(value)
-            if format == 'full':
-                format = "EEEE MMMM, d, y 'at' h:mma"
-            elif format == 'medium':
-                format = "EE MM, dd, y h:mma"
-            return babel.dates.format_datetime(date, format, locale='en')
-        else:
-            date = value
-
-
+    from fyyur.filters import format_datetime
     app.jinja_env.filters['datetime'] = format_datetime
 
+    # Compiled templates are written to disk so that new workers and
+    # restarts load bytecode instead of compiling every template again.
+    bytecode_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+
 
     if not app.debug:
         file_handler = FileHandler('error.log')
@@ -0,0 +1,72 @@
+from datetime import datetime
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context
+)
+from fyyur import db, export, jobs
+from fyyur.cache import response_cache
+
+
+# Blueprint configuration
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+@admin.before_request
+def require_token():
+    # when ADMIN_TOKEN is configured every admin request must present it;
+    # without one only a debug app serves the admin endpoints
+    token = current_app.config['ADMIN_TOKEN']
+    if not token:
+        if not current_app.debug:
+            abort(403)
+    elif request.headers.get('X-Admin-Token') != token:
+        abort(403)
+
+
+# ***** Response Cache Stats *****
+
+@admin.route('/cache')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+
+# ***** Connection Pool Stats *****
+
+@admin.route('/pool')
+def pool_stats():
+    pool = db.engine.pool
+    if hasattr(pool, 'stats'):
+        return jsonify(pool.stats())
+    return jsonify(status=pool.status())
+
+
+# ***** Background Job Stats *****
+
+@admin.route('/jobs')
+def job_stats():
+    window = request.args.get('window', 3600, type=int)
+    return jsonify(jobs.stats(window))
+
+
+# ***** Streaming Export *****
+
+@admin.route('/export/<kind>')
+def export_rows(kind):
+    output_format = request.args.get('format', 'ndjson')
+    if kind not in export.KINDS or output_format not in export.FORMATS:
+        abort(404)
+    since = request.args.get('since')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        abort(400)
+
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export.export(kind, output_format, since)),
+        mimetype=mimetype)
@@ -0,0 +1,165 @@
+import json
+from datetime import datetime
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    request,
+    stream_with_context
+)
+from fyyur import db
+from fyyur.models import Artist, Show, Venue
+
+# Blueprint configuration
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# rows are pulled from a server-side cursor this many at a time
+STREAM_BATCH_SIZE = 1000
+
+# public fields of each resource and the columns they come from
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'city': Venue.city,
+    'state': Venue.state,
+    'address': Venue.address,
+    'phone': Venue.phone,
+    'genres': Venue.genres,
+    'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link,
+    'website': Venue.website,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'num_upcoming_shows': Venue.num_upcoming_shows,
+    'num_past_shows': Venue.num_past_shows,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'genres': Artist.genres,
+    'image_link': Artist.image_link,
+    'facebook_link': Artist.facebook_link,
+    'website': Artist.website,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'num_upcoming_shows': Artist.num_upcoming_shows,
+    'num_past_shows': Artist.num_past_shows,
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _selected_fields(available):
+    # ?fields=id,name restricts the output to those fields; id always comes
+    # along because it is the pagination cursor
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        abort(400)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _query(model, available, fields):
+    query = db.session.query(*[available[field] for field in fields])
+    if model is Show:
+        query = query.select_from(Show).join(
+            Venue, Show.venue_id == Venue.id).join(
+            Artist, Show.artist_id == Artist.id)
+    return query
+
+
+def _stream(model, available):
+    """NDJSON list, streamed from a server-side cursor in id order.
+
+    Pass the id of the last record received as ?after= to continue, and
+    ?limit= to cap the number of records.
+    """
+    fields = _selected_fields(available)
+    query = _query(model, available, fields).order_by(model.id)
+
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(model.id > after)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        if limit < 1:
+            abort(400)
+        query = query.limit(limit)
+
+    def generate():
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(
+                dict(zip(fields, row)), default=_json_default) + '\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
+
+
+def _detail(model, available, entity_id):
+    fields = _selected_fields(available)
+    row = _query(model, available, fields).filter(
+        model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    return Response(
+        json.dumps(dict(zip(fields, row)), default=_json_default),
+        mimetype='application/json')
+
+
+# ***** Venues *****
+
+@api.route('/venues')
+def list_venues():
+    return _stream(Venue, VENUE_FIELDS)
+
+
+@api.route('/venues/<int:venue_id>')
+def get_venue(venue_id):
+    return _detail(Venue, VENUE_FIELDS, venue_id)
+
+
+# ***** Artists *****
+
+@api.route('/artists')
+def list_artists():
+    return _stream(Artist, ARTIST_FIELDS)
+
+
+@api.route('/artists/<int:artist_id>')
+def get_artist(artist_id):
+    return _detail(Artist, ARTIST_FIELDS, artist_id)
+
+
+# ***** Shows *****
+
+@api.route('/shows')
+def list_shows():
+    return _stream(Show, SHOW_FIELDS)
+
+
+@api.route('/shows/<int:show_id>')
+def get_show(show_id):
+    return _detail(Show, SHOW_FIELDS, show_id)
@@ -11,7 +11,6 @@ from wtforms.validators import (
     URL,
     ValidationError
 )
-import phonenumbers
 
 
 class ArtistForm(FlaskForm):
@@ -120,6 +119,8 @@ class ArtistForm(FlaskForm):
     def validate_phone(self, phone):
         if len(phone.data) != 10:
             raise ValidationError('Invalid phone number.')
+        # the phone metadata is large, load it only when a number is checked
+        import phonenumbers
         try:
             input_number = phonenumbers.parse(phone.data)
             if not (phonenumbers.is_valid_number(input_number)):
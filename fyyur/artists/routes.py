@@ -1,21 +1,30 @@
 import sys
 from datetime import datetime
+from operator import attrgetter
 from flask import (
     Blueprint,
+    current_app,
     render_template,
     url_for,
     request,
     flash,
-    redirect
+    redirect,
+    jsonify
 )
-from sqlalchemy import or_
-from fyyur import db
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import selectinload
+from fyyur import counters, db, facets, jobs, purge
+from fyyur.autocomplete import artist_index
+from fyyur.cache import add_tags, cached, response_cache
+from fyyur.database import use_primary, use_replica
 from fyyur.artists.forms import ArtistForm
-from fyyur.models import Artist, Show, Venue
+from fyyur.models import Artist, Show
 
 # Blueprint configuration
 artists = Blueprint('artists', __name__, url_prefix='/artists')
 
+SEARCH_RESULTS_LIMIT = 50
+
 
 # ***** Create a New Artist *****
 
@@ -47,6 +56,12 @@ def create_artist_submission():
 
             db.session.add(artist)
             db.session.commit()
+            artist_index.add(artist.id, artist.name)
+            if artist.image_link and jobs.has_worker():
+                jobs.enqueue('check_image_link', kind='artist',
+                             entity_id=artist.id)
+            response_cache.invalidate('home', 'artists')
+            facets.invalidate('artist')
 
             flash(
                 f'Artist {request.form["name"]} was successfully listed!',
@@ -71,6 +86,7 @@ def create_artist_submission():
 # ***** Get All Artists *****
 
 @artists.route('/')
+@cached('artists')
 def all_artists():
     data = Artist.query.all()
     return render_template('pages/artists.html', artists=data)
@@ -78,25 +94,31 @@ def all_artists():
 
 # ***** Search Artist *****
 
-@artists.route('/search', methods=['POST'])
-def search_artists():
-    search_term = request.form.get('search_term', '')
-    artists = Artist.query.filter(or_(
+def artist_search_query(search_term):
+    # the ILIKE predicates are served by the trigram indexes on Artist;
+    # hits are ranked by name similarity and capped at SEARCH_RESULTS_LIMIT
+    return select(
+        Artist.id,
+        Artist.name,
+        Artist.num_upcoming_shows
+    ).where(or_(
         Artist.name.ilike(f'%{search_term}%'),
         Artist.city.ilike(f'{search_term}'),
         Artist.state.ilike(f'{search_term}')
-    )).all()
+    )).order_by(
+        func.similarity(Artist.name, search_term).desc(),
+        Artist.name
+    ).limit(SEARCH_RESULTS_LIMIT)
+
 
+def render_artist_search(artists, search_term):
     data = []
 
     for artist in artists:
-        upcoming_shows = db.session.query(Show).join(Venue).filter(
-            Show.artist_id == artist.id).filter(Show.start_time > datetime.now()).all()
-            
         data.append({
             'id': artist.id,
             'name': artist.name,
-            'num_upcoming_shows': len(upcoming_shows)
+            'num_upcoming_shows': artist.num_upcoming_shows
         })
     response = {
         "count": len(artists),
@@ -105,14 +127,47 @@ def search_artists():
     return render_template(
         'pages/search_artists.html',
         results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
+        search_term=search_term)
+
+
+@artists.route('/search', methods=['POST'])
+@use_replica
+def search_artists():
+    search_term = request.form.get('search_term', '')
+    return render_artist_search(
+        db.session.execute(artist_search_query(search_term)).all(),
+        search_term)
+
+
+# ***** Browse Artists by Genre and Place *****
+
+@artists.route('/browse')
+def browse_artists():
+    # ?genre=Jazz&state=CA, with the facet counts of fyyur.facets
+    return facets.browse('artist')
+
+
+# ***** Autocomplete Artist Names *****
+
+@artists.route('/autocomplete')
+def autocomplete_artists():
+    # answered from the in-memory prefix index, never from the database
+    suggestions = artist_index.search(request.args.get('q', ''))
+    return jsonify(data=suggestions)
 
 
 # ***** Get a Single Artist by ID *****
 
+def render_artist(artist, upcoming_shows, past_shows):
+    artist.upcoming_shows = upcoming_shows
+    artist.upcoming_shows_count = len(upcoming_shows)
+    artist.past_shows = past_shows
+    artist.past_shows_count = len(past_shows)
+    return render_template('pages/show_artist.html', artist=artist)
+
+
 @artists.route('/<int:artist_id>')
+@cached('artist:{artist_id}')
 def show_artist(artist_id):
     """
     The function takes in an artist_id and returns a page with the artist's details and upcoming and
@@ -121,47 +176,29 @@ def show_artist(artist_id):
     :param artist_id: the ID of the artist
     :return: The show_artist function returns a rendered template of the show_artist.html page.
     """
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.options(
+        selectinload(Artist.shows).joinedload(Show.venues)
+    ).filter_by(id=artist_id).first_or_404()
 
+    now = datetime.now()
     upcoming_show_venue_details = []
     past_show_venue_details = []
 
-    past_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(Show.start_time < datetime.now()).all()
-
-    upcoming_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(Show.start_time > datetime.now()).all()
-
-
-    setattr(artist, 'upcoming_shows', upcoming_shows)
-    setattr(artist, 'upcoming_shows_count', len(upcoming_shows))
-    setattr(artist, 'past_shows', past_shows)
-    setattr(artist, 'past_shows_count', len(past_shows))
-
-    for show in artist.upcoming_shows:
-        venue_details = {}
-        venue_details['venue_id'] = show.venue_id
-        venue_details['venue_image_link'] = show.venues.image_link
-        venue_details['venue_name'] = show.venues.name
-        venue_details['start_time'] = show.start_time.strftime(
-            '%Y-%m-%d %H:%M:%S')
-
-        upcoming_show_venue_details.append(venue_details)
-
-    artist.upcoming_shows = upcoming_show_venue_details
-
-    for show in artist.past_shows:
+    for show in sorted(artist.shows, key=attrgetter('start_time')):
+        add_tags(f'venue:{show.venue_id}')
         venue_details = {}
         venue_details['venue_id'] = show.venue_id
         venue_details['venue_image_link'] = show.venues.image_link
         venue_details['venue_name'] = show.venues.name
-        venue_details['start_time'] = show.start_time.strftime(
-            '%Y-%m-%d %H:%M:%S')
+        venue_details['start_time'] = show.start_time
 
-        past_show_venue_details.append(venue_details)
+        if show.start_time > now:
+            upcoming_show_venue_details.append(venue_details)
+        else:
+            past_show_venue_details.append(venue_details)
 
-    artist.past_shows = past_show_venue_details
-    return render_template('pages/show_artist.html', artist=artist)
+    return render_artist(
+        artist, upcoming_show_venue_details, past_show_venue_details)
 
 
 # ***** Update Artist *****
@@ -198,6 +235,7 @@ def edit_artist_submission(artist_id):
     form = ArtistForm()
     artist = Artist.query.get(artist_id)
     try:
+        faceted = (artist.genres, artist.city, artist.state)
         artist.name = form.name.data
         artist.city = form.city.data
         artist.state = form.state.data
@@ -208,9 +246,18 @@ def edit_artist_submission(artist_id):
         artist.website = form.website_link.data
         artist.seeking_venue = form.seeking_venue.data
         artist.seeking_description = form.seeking_description.data
+        faceted = faceted != (artist.genres, artist.city, artist.state)
 
         db.session.add(artist)
         db.session.commit()
+        artist_index.add(artist.id, artist.name)
+        if artist.image_link and jobs.has_worker():
+            jobs.enqueue('check_image_link', kind='artist',
+                         entity_id=artist.id)
+        response_cache.invalidate(
+            'home', 'artists', 'shows', f'artist:{artist_id}')
+        if faceted:
+            facets.invalidate('artist')
 
         flash(
             f'Artist {request.form["name"]} was updated successfully!',
@@ -230,11 +277,37 @@ def edit_artist_submission(artist_id):
 
 # ***** Delete Artist *****
 @artists.route('/<artist_id>/delete', methods=['GET', 'POST'])
+@use_primary
 def delete_artist(artist_id):
     artist = Artist.query.get_or_404(artist_id)
+    # forgetting the shows changes the counters of every venue they were at
+    venue_tags = [f'venue:{venue_id}' for venue_id, in db.session.query(
+        Show.venue_id).filter(Show.artist_id == artist.id).distinct()]
+    tags = ('home', 'venues', 'artists', 'shows', f'artist:{artist_id}',
+            *venue_tags)
+    large = artist.num_upcoming_shows + artist.num_past_shows > \
+        current_app.config['PURGE_INLINE_LIMIT']
+    if large and jobs.has_worker():
+        jobs.enqueue('purge', kind='artist', entity_id=artist.id)
+        artist_index.remove(int(artist_id))
+        response_cache.invalidate(*tags)
+        facets.invalidate('artist')
+
+        flash('Artist is being deleted in the background', 'success')
+        return redirect(url_for('home.index'))
+
     try:
-        db.session.delete(artist)
-        db.session.commit()
+        if large:
+            # nothing runs queued jobs, so purge in batches right here
+            purge.purge(Artist, artist.id,
+                        current_app.config['PURGE_BATCH_SIZE'])
+        else:
+            counters.forget_shows(Artist, artist.id)
+            db.session.delete(artist)
+            db.session.commit()
+        artist_index.remove(int(artist_id))
+        response_cache.invalidate(*tags)
+        facets.invalidate('artist')
 
         flash('Artist deleted successfully', 'success')
         return redirect(url_for('home.index'))
@@ -0,0 +1,161 @@
+"""Fingerprinted, pre-compressed static assets.
+
+`flask build-assets` copies every file under static/ to static/dist/ with
+a content hash in its name (css/main.css -> css/main.3f9c0e1a2b7d.css),
+writes .gz and, when the optional brotli package is installed, .br
+copies of the text assets, and records both in static/dist/manifest.json.
+url() references inside stylesheets are rewritten to the hashed names, so
+a font change also changes the hash of the CSS that uses it.
+
+Templates call asset_url('css/main.css'). Built files are served from
+/assets/ with a one-year immutable Cache-Control, in the best encoding
+the browser accepts; files missing from the manifest fall back to the
+plain /static/ URL.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot',
+                '.json', '.txt')
+# (Content-Encoding, file suffix) in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _hashed_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, extension = posixpath.splitext(name)
+    return f'{stem}.{digest}{extension}'
+
+
+def _rewrite_css(name, content, files):
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', target).groups()
+        resolved = posixpath.normpath(posixpath.join(directory, path))
+        if resolved not in files:
+            return match.group(0)
+        relative = posixpath.relpath(files[resolved], directory or '.')
+        return f'url({quote}{relative}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as target:
+        target.write(content)
+
+
+def build(static_folder):
+    """Rebuild static/dist and return the manifest."""
+    output = os.path.join(static_folder, DIST)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+
+    sources = []
+    for root, directories, filenames in os.walk(static_folder):
+        directories[:] = [directory for directory in directories
+                          if os.path.join(root, directory) != output]
+        for filename in filenames:
+            if not filename.startswith('.'):
+                path = os.path.join(root, filename)
+                sources.append(os.path.relpath(
+                    path, static_folder).replace(os.sep, '/'))
+
+    # stylesheets go last so they can point at the hashed fonts and images
+    sources.sort(key=lambda name: (name.endswith('.css'), name))
+    files = {}
+    compressed = {}
+    for name in sources:
+        with open(os.path.join(static_folder, name), 'rb') as source:
+            content = source.read()
+        if name.endswith('.css'):
+            content = _rewrite_css(name, content, files)
+
+        hashed = _hashed_name(name, content)
+        files[name] = hashed
+        _write(os.path.join(output, hashed), content)
+        if not name.endswith(COMPRESSIBLE):
+            continue
+
+        variants = {'gzip': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(content)
+        for encoding, suffix in ENCODINGS:
+            data = variants.get(encoding)
+            # small files can come out larger than they went in
+            if data is not None and len(data) < len(content):
+                _write(os.path.join(output, hashed + suffix), data)
+                compressed.setdefault(hashed, []).append(encoding)
+
+    manifest = {'files': files, 'compressed': compressed}
+    with open(os.path.join(output, MANIFEST), 'w') as target:
+        json.dump(manifest, target, indent=2, sort_keys=True)
+    return manifest
+
+
+def load(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as source:
+            return json.load(source)
+    except FileNotFoundError:
+        return {'files': {}, 'compressed': {}}
+
+
+def asset_url(filename):
+    hashed = current_app.extensions['assets']['files'].get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+
+def serve_asset(filename):
+    encodings = current_app.extensions['assets']['compressed'].get(
+        filename, ())
+    path = filename
+    content_encoding = None
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            path = filename + suffix
+            content_encoding = encoding
+            break
+
+    response = send_from_directory(
+        os.path.join(current_app.static_folder, DIST), path,
+        mimetype=mimetypes.guess_type(filename)[0]
+        or 'application/octet-stream',
+        max_age=MAX_AGE)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.headers['Cache-Control'] = \
+        f'public, max-age={MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    app.extensions['assets'] = load(app.static_folder)
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
@@ -0,0 +1,221 @@
+"""Async versions of the read-only pages, served when ASYNC_READS is set.
+
+The home page, the venue, artist and show listings, both searches and the
+venue and artist pages are replaced by `async def` views that query
+Postgres through SQLAlchemy's asyncio extension (asyncpg) and run a
+page's independent queries at once; the venue page fetches the venue, its
+upcoming shows and its past shows concurrently. They use the same
+statements and templates as the sync views and keep their cache tags.
+Form handlers and everything else stay sync.
+
+Flask runs every async view in an event loop of its own, but asyncpg
+connections belong to the loop that opened them. Each worker process
+therefore keeps one long-lived loop in a background thread that owns the
+async engines and their pools, and views await their queries on it.
+"""
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import abort, current_app, g, render_template, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from fyyur.artists.routes import (
+    artist_search_query,
+    render_artist,
+    render_artist_search
+)
+from fyyur.cache import add_tags, cached
+from fyyur.database import RoutingSession, use_replica
+from fyyur.instrumentation import statement_shape
+from fyyur.models import Artist, Show, Venue
+from fyyur.shows.routes import render_shows_page, shows_page_query
+from fyyur.venues.routes import (
+    render_venue,
+    render_venue_areas,
+    render_venue_search,
+    venue_areas_query,
+    venue_search_query
+)
+
+
+class AsyncDatabase:
+    """The worker's database event loop and its async engines, one per
+    bind, all created on first use."""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = None
+        self.engines = {}
+        self._lock = threading.Lock()
+
+    def _loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever,
+                                 name='fyyur-async-db', daemon=True).start()
+            return self.loop
+
+    def _engine(self, bind):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        with self._lock:
+            if bind not in self.engines:
+                config = self.app.config
+                uri = config['SQLALCHEMY_BINDS'][bind] if bind \
+                    else config['SQLALCHEMY_DATABASE_URI']
+                self.engines[bind] = create_async_engine(
+                    make_url(uri).set(drivername='postgresql+asyncpg'),
+                    pool_size=config['DB_POOL_SIZE'],
+                    max_overflow=config['DB_MAX_OVERFLOW'],
+                    pool_timeout=config['DB_POOL_TIMEOUT'],
+                    pool_recycle=config['DB_POOL_RECYCLE'],
+                    pool_pre_ping=config['DB_POOL_PRE_PING'],
+                    connect_args={'server_settings': {
+                        'statement_timeout':
+                            str(config['DB_STATEMENT_TIMEOUT_MS'])}})
+            return self.engines[bind]
+
+    @staticmethod
+    async def _execute(engine, statement):
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        async with AsyncSession(engine) as session:
+            result = await session.execute(statement)
+            return result.all()
+
+    async def fetch(self, statement):
+        """Run a SELECT on the database loop and return its rows."""
+        # the same replica routing as RoutingSession
+        bind = None
+        if RoutingSession._reads_from_replica():
+            bind = random.choice(current_app.config['DB_REPLICA_BINDS'])
+
+        started = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(
+            self._execute(self._engine(bind), statement), self._loop())
+        rows = await asyncio.wrap_future(future)
+
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats['count'] += 1
+            stats['seconds'] += time.perf_counter() - started
+            stats['shapes'][statement_shape(str(statement))] += 1
+        return rows
+
+
+def fetch(statement):
+    return current_app.extensions['async_reads'].fetch(statement)
+
+
+def _detail_shows(key, entity_id, other, now):
+    # the upcoming and past shows of a venue or artist, each with the
+    # columns of the other side the detail page shows
+    prefix = other.__tablename__.lower()
+    shows = select(
+        getattr(Show, f'{prefix}_id'),
+        other.name.label(f'{prefix}_name'),
+        other.image_link.label(f'{prefix}_image_link'),
+        Show.start_time
+    ).join(other, getattr(Show, f'{prefix}_id') == other.id).where(
+        key == entity_id).order_by(Show.start_time)
+    return (fetch(shows.where(Show.start_time > now)),
+            fetch(shows.where(Show.start_time <= now)))
+
+
+# ***** Pages *****
+
+async def index():
+    venues, artists = await asyncio.gather(
+        fetch(select(Venue).order_by(Venue.id.desc()).limit(10)),
+        fetch(select(Artist).order_by(Artist.id.desc()).limit(10)))
+    return render_template(
+        'pages/home.html',
+        venues=[venue for venue, in venues],
+        artists=[artist for artist, in artists])
+
+
+async def all_venues():
+    return render_venue_areas(await fetch(venue_areas_query()))
+
+
+async def all_artists():
+    artists = await fetch(select(Artist))
+    return render_template(
+        'pages/artists.html', artists=[artist for artist, in artists])
+
+
+async def all_shows():
+    query, per_page = shows_page_query()
+    return render_shows_page(await fetch(query), per_page)
+
+
+async def search_venues():
+    search_term = request.form.get('search_term', '')
+    return render_venue_search(
+        await fetch(venue_search_query(search_term)), search_term)
+
+
+async def search_artists():
+    search_term = request.form.get('search_term', '')
+    return render_artist_search(
+        await fetch(artist_search_query(search_term)), search_term)
+
+
+async def show_venue(venue_id):
+    venue, upcoming, past = await asyncio.gather(
+        fetch(select(Venue).where(Venue.id == venue_id)),
+        *_detail_shows(Show.venue_id, venue_id, Artist, datetime.now()))
+    if not venue:
+        abort(404)
+    for show in upcoming + past:
+        add_tags(f'artist:{show.artist_id}')
+    return render_venue(venue[0][0],
+                        [show._asdict() for show in upcoming],
+                        [show._asdict() for show in past])
+
+
+async def show_artist(artist_id):
+    artist, upcoming, past = await asyncio.gather(
+        fetch(select(Artist).where(Artist.id == artist_id)),
+        *_detail_shows(Show.artist_id, artist_id, Venue, datetime.now()))
+    if not artist:
+        abort(404)
+    for show in upcoming + past:
+        add_tags(f'venue:{show.venue_id}')
+    return render_artist(artist[0][0],
+                         [show._asdict() for show in upcoming],
+                         [show._asdict() for show in past])
+
+
+# endpoint -> (async view, response cache tags or None)
+ASYNC_VIEWS = {
+    'home.index': (index, ('home',)),
+    'venues.all_venues': (all_venues, ('venues',)),
+    'artists.all_artists': (all_artists, ('artists',)),
+    'shows.all_shows': (all_shows, ('shows',)),
+    'venues.search_venues': (search_venues, None),
+    'artists.search_artists': (search_artists, None),
+    'venues.show_venue': (show_venue, ('venue:{venue_id}',)),
+    'artists.show_artist': (show_artist, ('artist:{artist_id}',)),
+}
+
+# read-only POST views, which read from a replica like the GET views
+REPLICA_POSTS = {'venues.search_venues', 'artists.search_artists'}
+
+
+def init_app(app):
+    """Swap the sync read views for the async ones; call after the
+    blueprints are registered."""
+    app.extensions['async_reads'] = AsyncDatabase(app)
+    for endpoint, (view, tags) in ASYNC_VIEWS.items():
+        view = app.ensure_sync(view)
+        if endpoint in REPLICA_POSTS:
+            view = use_replica(view)
+        if tags is not None:
+            view = cached(*tags)(view)
+        app.view_functions[endpoint] = view
@@ -0,0 +1,160 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+
+class PrefixIndex:
+    """In-process prefix index over entity names.
+
+    Every word of a name is indexed, so 'jaz' matches both 'Jazz Cafe' and
+    'The Jazz Bar'. Keys live in one sorted list and a lookup is a bisect
+    followed by a short scan, so it never touches the database.
+
+    Other worker processes keep their own copy, so the index is rebuilt
+    every refresh_after seconds to pick up their writes. The stale index
+    keeps answering while a single background thread loads the new one.
+    """
+
+    def __init__(self, loader, refresh_after=300):
+        # loader returns an iterable of (id, name) rows for a full build
+        self._loader = loader
+        self.refresh_after = refresh_after
+        self._keys = []
+        self._names = {}
+        self._built_at = None
+        # add() and remove() calls made while a build is loading, replayed
+        # onto the new index so they are not lost
+        self._changes = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def _suffixes(name):
+        name = name.lower()
+        yield name
+        for i, char in enumerate(name):
+            if char == ' ' and i + 1 < len(name) and name[i + 1] != ' ':
+                yield name[i + 1:]
+
+    def build(self):
+        with self._lock:
+            self._changes = []
+        try:
+            keys = []
+            names = {}
+            for entity_id, name in self._loader():
+                names[entity_id] = name
+                keys.extend((key, entity_id) for key in self._suffixes(name))
+            keys.sort()
+        except BaseException:
+            with self._lock:
+                self._changes = None
+            raise
+
+        with self._lock:
+            self._keys = keys
+            self._names = names
+            for entity_id, name in self._changes:
+                self._apply(entity_id, name)
+            self._changes = None
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            # nothing to answer from yet, so the first lookup waits
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+        elif time.monotonic() - self._built_at > self.refresh_after and \
+                self._build_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._refresh,
+                args=(current_app._get_current_object(),),
+                name='fyyur-autocomplete', daemon=True).start()
+
+    def _refresh(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        except BaseException:
+            app.logger.exception('rebuilding the autocomplete index failed')
+        finally:
+            self._build_lock.release()
+
+    def _apply(self, entity_id, name):
+        # name None removes the entity; call with self._lock held
+        self._discard(entity_id)
+        if name is None:
+            return
+        self._names[entity_id] = name
+        for key in self._suffixes(name):
+            insort(self._keys, (key, entity_id))
+
+    def add(self, entity_id, name):
+        with self._lock:
+            self._apply(entity_id, name)
+            if self._changes is not None:
+                self._changes.append((entity_id, name))
+
+    def remove(self, entity_id):
+        with self._lock:
+            self._apply(entity_id, None)
+            if self._changes is not None:
+                self._changes.append((entity_id, None))
+
+    def _discard(self, entity_id):
+        name = self._names.pop(entity_id, None)
+        if name is None:
+            return
+        for key in self._suffixes(name):
+            position = bisect_left(self._keys, (key, entity_id))
+            if position < len(self._keys) and \
+                    self._keys[position] == (key, entity_id):
+                del self._keys[position]
+
+    def search(self, prefix, limit=10):
+        self._ensure_fresh()
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, entity_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if entity_id not in seen:
+                    seen.add(entity_id)
+                    results.append(
+                        {'id': entity_id, 'name': self._names[entity_id]})
+                position += 1
+        return results
+
+
+def _load_venues():
+    from fyyur.models import Venue
+    return Venue.query.with_entities(Venue.id, Venue.name).all()
+
+
+def _load_artists():
+    from fyyur.models import Artist
+    return Artist.query.with_entities(Artist.id, Artist.name).all()
+
+
+venue_index = PrefixIndex(_load_venues)
+artist_index = PrefixIndex(_load_artists)
+
+
+def init_app(app):
+    for index in (venue_index, artist_index):
+        index.refresh_after = app.config['AUTOCOMPLETE_REFRESH_SECONDS']
+
+    @app.before_first_request
+    def build_indexes():
+        venue_index.build()
+        artist_index.build()
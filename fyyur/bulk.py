@@ -0,0 +1,164 @@
+"""Bulk import of venues, artists and shows from CSV or NDJSON files.
+
+Rows are validated with the same forms the create pages use, then written
+in batches with one executemany per batch instead of one commit per row.
+"""
+import csv
+import json
+import time
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from fyyur import counters, db
+from fyyur.artists.forms import ArtistForm
+from fyyur.models import Artist, Show, Venue
+from fyyur.shows.forms import ShowForm
+from fyyur.venues.forms import VenueForm
+
+EXCLUSION_VIOLATION = '23P01'
+
+# form field -> model column, for fields whose names differ
+RENAMED_FIELDS = {'website_link': 'website'}
+
+KINDS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+
+def read_rows(path):
+    """Yield dict rows from a .csv file or a newline delimited JSON file.
+
+    In CSV files genres are separated by ';'.
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(source):
+                if row.get('genres') is not None:
+                    row['genres'] = [genre.strip() for genre in
+                                     row['genres'].split(';') if genre.strip()]
+                yield row
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif isinstance(value, bool):
+            # BooleanField treats any submitted value as checked
+            if value:
+                formdata[key] = 'y'
+        elif value is not None:
+            formdata[key] = str(value)
+    return formdata
+
+
+def _record(form):
+    record = {}
+    for field in form:
+        record[RENAMED_FIELDS.get(field.name, field.name)] = field.data
+    return record
+
+
+class Importer:
+    def __init__(self, kind, batch_size=5000):
+        self.model, self.form_class = KINDS[kind]
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.rejected = []
+        self._batch = []
+        self._lines = []
+        # uniqueness and foreign keys are checked in memory so that one bad
+        # row cannot fail a whole batch
+        if self.model is Show:
+            self._venue_ids = {
+                venue_id for venue_id, in db.session.query(Venue.id)}
+            self._artist_ids = {
+                artist_id for artist_id, in db.session.query(Artist.id)}
+        else:
+            self._names = {name for name, in
+                           db.session.query(self.model.name)}
+
+    def _validate(self, row):
+        form = self.form_class(formdata=_formdata(row), meta={'csrf': False})
+        if not form.validate():
+            return None, '; '.join(
+                f'{name}: {", ".join(errors)}'
+                for name, errors in form.errors.items())
+
+        record = _record(form)
+        if self.model is Show:
+            if record['venue_id'] not in self._venue_ids:
+                return None, f'venue {record["venue_id"]} does not exist'
+            if record['artist_id'] not in self._artist_ids:
+                return None, f'artist {record["artist_id"]} does not exist'
+        else:
+            if record['name'] in self._names:
+                return None, f'name {record["name"]!r} already exists'
+            self._names.add(record['name'])
+        return record, None
+
+    def add(self, line_number, row):
+        record, error = self._validate(row)
+        if error:
+            self.rejected.append((line_number, error))
+            return
+        self._batch.append(record)
+        self._lines.append(line_number)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        batch = self._batch
+        try:
+            db.session.execute(self.model.__table__.insert(), batch)
+        except IntegrityError as error:
+            # a show overlapping another booking of its venue, in this file
+            # or already stored; only checked by the database, so the batch
+            # is written again one row at a time
+            if error.orig.pgcode != EXCLUSION_VIOLATION:
+                raise
+            db.session.rollback()
+            batch = self._insert_each()
+        if self.model is Show:
+            counters.record_shows(batch)
+        db.session.commit()
+        self.inserted += len(batch)
+        self._batch = []
+        self._lines = []
+
+    def _insert_each(self):
+        inserted = []
+        for line_number, record in zip(self._lines, self._batch):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(self.model.__table__.insert(), record)
+            except IntegrityError as error:
+                if error.orig.pgcode != EXCLUSION_VIOLATION:
+                    raise
+                self.rejected.append((
+                    line_number,
+                    f'venue {record["venue_id"]} already has a show booked '
+                    f'at that time'))
+            else:
+                inserted.append(record)
+        return inserted
+
+
+def import_file(kind, path, batch_size=5000):
+    """Import one file; returns the Importer and the elapsed seconds."""
+    started = time.perf_counter()
+    importer = Importer(kind, batch_size)
+    for line_number, row in enumerate(read_rows(path), start=1):
+        importer.add(line_number, row)
+    importer.flush()
+    return importer, time.perf_counter() - started
@@ -0,0 +1,176 @@
+"""In-process response cache for the read pages.
+
+Entries are keyed by request path, evicted least-recently-used once
+RESPONSE_CACHE_SIZE is reached, and expire after RESPONSE_CACHE_TTL
+seconds. Each entry carries tags ('venues', 'venue:3', ...) and the write
+handlers invalidate exactly the tags they affect. Every worker process has
+its own cache, so writes made through another worker are picked up when
+the TTL runs out.
+
+The {% cache %} template tag stores rendered fragments in the same cache,
+so the same tag invalidations drop them too. Neither is used for a client
+inside its read-your-writes window (DB_READ_YOUR_WRITES_SECONDS).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from fyyur.database import wrote_recently
+
+
+class ResponseCache:
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires'] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry, tags):
+        entry['tags'] = frozenset(tags)
+        entry['expires'] = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+        tags = set(tags)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry['tags'] & tags]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def init_app(app):
+    response_cache.max_entries = app.config['RESPONSE_CACHE_SIZE']
+    response_cache.ttl = app.config['RESPONSE_CACHE_TTL']
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def add_tags(*tags):
+    """Attach extra invalidation tags to the response being rendered."""
+    g.setdefault('cache_tags', set()).update(tags)
+
+
+def _finish(response, entry, status):
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.headers['X-Cache'] = status
+    return response.make_conditional(request)
+
+
+def cached(*tags):
+    """Cache a GET view's response under the given tags.
+
+    Tags are formatted with the view's keyword arguments, so
+    cached('venues', 'venue:{venue_id}') tags each venue page separately.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # pages carrying flashed messages are personal, never cache
+            # them; a client that just wrote must not get a page rendered
+            # from a lagging replica
+            if not current_app.config['RESPONSE_CACHE_ENABLED'] or \
+                    '_flashes' in session or wrote_recently():
+                return view(**kwargs)
+
+            key = request.full_path
+            entry = response_cache.get(key)
+            if entry is not None:
+                response = current_app.response_class(
+                    entry['body'], mimetype=entry['mimetype'])
+                return _finish(response, entry, 'HIT')
+
+            response = make_response(view(**kwargs))
+            if response.status_code != 200 or '_flashes' in session:
+                return response
+
+            body = response.get_data()
+            entry = {
+                'body': body,
+                'mimetype': response.mimetype,
+                'etag': hashlib.md5(body).hexdigest(),
+                'last_modified': datetime.utcnow().replace(microsecond=0),
+            }
+            response_cache.set(
+                key, entry,
+                [tag.format(**kwargs) for tag in tags]
+                + list(g.pop('cache_tags', ())))
+            return _finish(response, entry, 'MISS')
+        return wrapper
+    return decorator
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache tag, version... %}...{% endcache %}
+
+    The first argument is both the invalidation tag and the key prefix
+    ('venue:' ~ venue.id); the remaining arguments identify the version of
+    the fragment, such as venue.updated_at.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        if not current_app.config['FRAGMENT_CACHE_ENABLED'] or \
+                wrote_recently():
+            return caller()
+
+        key = 'fragment:' + ':'.join(str(part) for part in parts)
+        entry = response_cache.get(key)
+        if entry is not None:
+            return entry['body']
+
+        body = caller()
+        response_cache.set(key, {'body': body},
+                           [str(parts[0])] + list(g.get('cache_tags', ())))
+        return body
@@ -0,0 +1,267 @@
+import json
+import os
+from datetime import datetime
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import func, or_
+
+from fyyur import assets, bulk, counters, db, export, jobs, purge
+from fyyur.models import Artist, Show, Venue
+
+
+db_cli = AppGroup('db-check', help='Checks against the live database.')
+
+INDEXED_TABLES = ('Show', 'Venue', 'Artist')
+
+
+def _hot_path_queries():
+    # the statements the listing, detail and search routes depend on
+    now = datetime.now()
+    some_venue = db.session.query(func.min(Venue.id)).scalar() or 1
+    some_artist = db.session.query(func.min(Artist.id)).scalar() or 1
+
+    return {
+        'venue upcoming shows': db.session.query(Show).filter(
+            Show.venue_id == some_venue, Show.start_time > now),
+        'artist upcoming shows': db.session.query(Show).filter(
+            Show.artist_id == some_artist, Show.start_time > now),
+        'shows page': db.session.query(Show.id, Show.start_time).filter(
+            Show.start_time > now).order_by(
+            Show.start_time, Show.id).limit(30),
+        'venue areas': db.session.query(Venue.city, Venue.state).order_by(
+            Venue.state, Venue.city),
+        'venue search': db.session.query(Venue.id, Venue.name).filter(or_(
+            Venue.name.ilike('%music%'), Venue.city.ilike('music'))),
+        'artist search': db.session.query(Artist.id, Artist.name).filter(or_(
+            Artist.name.ilike('%music%'), Artist.city.ilike('music'))),
+        'venue genre': db.session.query(Venue.id).filter(
+            Venue.genres.contains(['Jazz'])),
+    }
+
+
+def _sequential_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan' and \
+            plan.get('Relation Name') in INDEXED_TABLES:
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from _sequential_scans(child)
+
+
+@db_cli.command('explain')
+@click.option('--force-index/--no-force-index', default=True,
+              help='Disable sequential scans so small databases still show '
+                   'whether an index can serve each query.')
+def explain(force_index):
+    """EXPLAIN the hot-path queries and fail if any needs a seq scan."""
+    connection = db.engine.raw_connection()
+    failures = 0
+    try:
+        cursor = connection.cursor()
+        if force_index:
+            cursor.execute('SET enable_seqscan = off')
+
+        for name, query in _hot_path_queries().items():
+            compiled = query.statement.compile(dialect=db.engine.dialect)
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {compiled}',
+                           compiled.params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = sorted(set(_sequential_scans(plan[0]['Plan'])))
+
+            if scans:
+                failures += 1
+                click.echo(f'FAIL  {name}: seq scan on {", ".join(scans)}')
+            else:
+                click.echo(f'ok    {name}')
+    finally:
+        connection.rollback()
+        connection.close()
+
+    if failures:
+        raise SystemExit(1)
+
+
+counters_cli = AppGroup(
+    'counters', help='Maintain upcoming/past show counters.')
+
+
+@counters_cli.command('roll')
+def roll_counters():
+    """Move shows that have started from upcoming to past (run from cron)."""
+    moved = counters.roll_over()
+    click.echo(f'{moved} shows moved from upcoming to past')
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters():
+    """Recompute every counter from the Show table."""
+    counters.rebuild()
+    click.echo('counters rebuilt')
+
+
+@counters_cli.command('check')
+def check_counters():
+    """Compare every counter with the Show table."""
+    mismatches = counters.check()
+    for model, entity_id, stored, actual in mismatches:
+        click.echo(f'{model} {entity_id}: stored (upcoming, past) = {stored}, '
+                   f'actual = {actual}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('counters ok')
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--threads', type=int, default=None,
+              help='Jobs run at once, JOBS_WORKER_THREADS by default.')
+def work(threads):
+    """Run queued jobs until interrupted.
+
+    Start several of these to spread jobs over processes.
+    """
+    worker = jobs.Worker(current_app._get_current_object(),
+                         threads or current_app.config['JOBS_WORKER_THREADS'])
+    click.echo(f'working on {current_app.config["JOBS_DB_PATH"]} '
+               f'with {worker.threads} threads')
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name', type=click.Choice(sorted(jobs.registry)))
+@click.option('--kwargs', 'kwargs', default='{}',
+              help='Keyword arguments for the job as a JSON object.')
+def enqueue_job(name, kwargs):
+    """Queue a job, e.g. counters.rebuild."""
+    job_id = jobs.enqueue(name, **json.loads(kwargs))
+    click.echo(f'job {job_id} queued')
+
+
+@jobs_cli.command('stats')
+@click.option('--window', default=3600, show_default=True,
+              help='Seconds of finished jobs to report latency for.')
+def job_stats(window):
+    """Print queue depth and job latency as JSON."""
+    click.echo(json.dumps(jobs.stats(window), indent=2))
+
+
+@jobs_cli.command('prune')
+@click.option('--older-than', default=7 * 24 * 3600, show_default=True,
+              help='Seconds since a job finished.')
+def prune_jobs(older_than):
+    """Delete finished and failed jobs."""
+    click.echo(f'{jobs.prune(older_than)} jobs deleted')
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(bulk.KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows written per executemany and commit.')
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows to this file as NDJSON.')
+@with_appcontext
+def import_command(kind, path, batch_size, rejects):
+    """Bulk import venues, artists or shows from a .csv or .ndjson file."""
+    # the forms expect a request context even without CSRF
+    with current_app.test_request_context():
+        g.db_statement_timeout = 0
+        importer, seconds = bulk.import_file(kind, path, batch_size)
+
+    for line_number, error in importer.rejected:
+        if rejects:
+            rejects.write(json.dumps(
+                {'line': line_number, 'error': error}) + '\n')
+        else:
+            click.echo(f'line {line_number}: {error}', err=True)
+
+    rate = importer.inserted / seconds if seconds else importer.inserted
+    click.echo(f'{importer.inserted} {kind} imported, '
+               f'{len(importer.rejected)} rejected '
+               f'in {seconds:.1f}s ({rate:.0f} rows/s)')
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(export.KINDS))
+@click.option('--format', 'output_format', type=click.Choice(export.FORMATS),
+              default='ndjson', show_default=True)
+@click.option('--output', type=click.File('w'), default='-',
+              help='Destination file, stdout by default.')
+@click.option('--since', type=click.DateTime(),
+              help='Only export rows updated after this time. Deleted '
+                   'rows are not included.')
+@click.option('--watermark-file', type=click.Path(dir_okay=False),
+              help='Read --since from this file and store the new '
+                   'watermark in it after a successful export.')
+@with_appcontext
+def export_command(kind, output_format, output, since, watermark_file):
+    """Stream venues, artists or shows as CSV or NDJSON.
+
+    Incremental exports (--since or --watermark-file) never report
+    deletions; run a full export now and then to find the deleted ids.
+    """
+    if since is None and watermark_file and os.path.exists(watermark_file):
+        with open(watermark_file) as source:
+            since = datetime.fromisoformat(source.read().strip())
+
+    watermark = {}
+    for chunk in export.export(kind, output_format, since, watermark):
+        output.write(chunk)
+    output.flush()
+
+    if watermark_file and watermark:
+        with open(watermark_file, 'w') as target:
+            target.write(watermark['updated_at'].isoformat())
+    if watermark:
+        click.echo(f'watermark: {watermark["updated_at"].isoformat()}',
+                   err=True)
+
+
+@click.command('purge')
+@click.argument('kind', type=click.Choice(['venue', 'artist']))
+@click.argument('entity_id', type=int)
+@click.option('--batch-size', default=None, type=int,
+              help='Shows deleted per transaction, PURGE_BATCH_SIZE by '
+                   'default.')
+@with_appcontext
+def purge_command(kind, entity_id, batch_size):
+    """Delete a venue or artist and its shows in batches.
+
+    Also finishes a background purge that was interrupted.
+    """
+    model = Venue if kind == 'venue' else Artist
+    deleted = purge.purge(
+        model, entity_id,
+        batch_size or current_app.config['PURGE_BATCH_SIZE'])
+    click.echo(f'{kind} {entity_id} purged with {deleted} shows')
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Fill the Jinja bytecode cache so workers start warm."""
+    environment = current_app.jinja_env
+    names = [name for name in environment.list_templates()
+             if name.endswith('.html')]
+    for name in names:
+        environment.get_template(name)
+    click.echo(f'{len(names)} templates compiled')
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and pre-compress static/ into static/dist."""
+    manifest = assets.build(current_app.static_folder)
+    current_app.extensions['assets'] = manifest
+    note = '' if assets.brotli else ' (gzip only, brotli is not installed)'
+    click.echo(f'{len(manifest["files"])} assets built, '
+               f'{len(manifest["compressed"])} pre-compressed{note}')
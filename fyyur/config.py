@@ -1,17 +1,156 @@
 import os
+import tempfile
+from fyyur.database import TimedQueuePool
+
+
+def env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
 
 class Config:
-    SECRET_KEY = os.urandom(32)
+    # Must be the same in every worker process, or a form rendered by one
+    # worker fails CSRF validation in another.
+    SECRET_KEY = os.environ.get('SECRET_KEY')
     DATABASE_NAME = 'fyyur'
     username = 'postgres'
     url = 'localhost:5432'
-    SQLALCHEMY_DATABASE_URI = "postgresql://{}@{}/{}".format(
-        username, url, DATABASE_NAME
-    )
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL',
+        "postgresql://{}@{}/{}".format(username, url, DATABASE_NAME))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool, sized per worker process. Statements a web request
+    # runs for longer than DB_STATEMENT_TIMEOUT_MS are cancelled by Postgres
+    # so a slow query fails fast instead of holding the worker. Migrations,
+    # the `flask` maintenance commands and job workers run without a limit.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = env_flag('DB_POOL_PRE_PING', True)
+    DB_STATEMENT_TIMEOUT_MS = int(
+        os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': TimedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+    # Read replicas, as a comma separated list of URIs. GET requests read
+    # from a replica unless the client wrote within the last
+    # DB_READ_YOUR_WRITES_SECONDS.
+    SQLALCHEMY_BINDS = {
+        'replica_{}'.format(number): uri
+        for number, uri in enumerate(
+            filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')))
+    }
+    DB_REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+    DB_READ_YOUR_WRITES_SECONDS = int(
+        os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+
+    # A request running one statement shape more often than this is
+    # reported as a likely N+1; SQL_REPEAT_RAISE turns the warning into an
+    # error.
+    SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 10))
+    SQL_REPEAT_RAISE = env_flag('SQL_REPEAT_RAISE', False)
+
+    # Requests slower than this are logged as warnings with their timings.
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+
+    # Seconds before a worker rebuilds its name autocomplete index.
+    AUTOCOMPLETE_REFRESH_SECONDS = 300
+
+    # Per-worker response cache for the read pages.
+    RESPONSE_CACHE_ENABLED = env_flag('RESPONSE_CACHE_ENABLED', True)
+    RESPONSE_CACHE_SIZE = 512
+    RESPONSE_CACHE_TTL = 60
+
+    # Cached {% cache %} template fragments share the response cache.
+    FRAGMENT_CACHE_ENABLED = env_flag('FRAGMENT_CACHE_ENABLED', True)
+
+    # Per-worker cache of the browse page facet counts. Writes through this
+    # worker drop it at once; the TTL bounds how long another worker's
+    # writes go unseen.
+    FACET_CACHE_SIZE = 256
+    FACET_CACHE_TTL = 300
+
+    # Serve home, the listings, search and the detail pages from async views
+    # on SQLAlchemy's asyncio extension (needs asyncpg and asgiref); see
+    # fyyur/async_reads.py and asgi.py.
+    ASYNC_READS = env_flag('ASYNC_READS', False)
+
+    # Where compiled template bytecode is kept between worker restarts.
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'fyyur-jinja'))
+
+    # Venues and artists with more shows than PURGE_INLINE_LIMIT are deleted
+    # PURGE_BATCH_SIZE shows per transaction, in the background when a job
+    # worker runs.
+    PURGE_INLINE_LIMIT = int(os.environ.get('PURGE_INLINE_LIMIT', 1000))
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+
+    # Incremental exports also return rows stamped up to this many seconds
+    # before the watermark, to catch transactions that committed late. Keep
+    # it above the longest write transaction.
+    EXPORT_OVERLAP_SECONDS = int(os.environ.get('EXPORT_OVERLAP_SECONDS', 300))
+
+    # Background jobs: the SQLite queue file, threads per `flask jobs work`
+    # process, the first retry delay (doubled on every further attempt) and
+    # how long a job may run before another worker takes it over.
+    # JOBS_EMBEDDED_THREADS > 0 also runs a worker inside each web process;
+    # set JOBS_WORKER when `flask jobs work` runs next to the web server.
+    # With neither, large deletes run inline and no jobs are queued.
+    JOBS_DB_PATH = os.environ.get(
+        'JOBS_DB_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(os.path.dirname(
+            __file__))), 'jobs.sqlite3'))
+    JOBS_WORKER_THREADS = int(os.environ.get('JOBS_WORKER_THREADS', 2))
+    JOBS_RETRY_DELAY = 30
+    JOBS_STALE_SECONDS = 3600
+    JOBS_EMBEDDED_THREADS = int(os.environ.get('JOBS_EMBEDDED_THREADS', 0))
+    JOBS_WORKER = env_flag('JOBS_WORKER', False)
+    # Jobs every worker keeps queued: name -> seconds between runs.
+    # counters.roll moves started shows from upcoming to past.
+    JOBS_SCHEDULE = {'counters.roll': 60}
+
+    # Shared secret for /admin endpoints; when empty the endpoints are open
+    # in debug mode and closed otherwise.
+    ADMIN_TOKEN = os.environ.get('FYYUR_ADMIN_TOKEN', '')
+
     # Grabs the folder where the script runs.
     basedir = os.path.abspath(os.path.dirname(__file__))
 
+    DEBUG = False
+
+
+class DevelopmentConfig(Config):
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'fyyur-development-key')
+
+    # Run queued jobs inside `flask run`, so nothing else has to be started.
+    JOBS_EMBEDDED_THREADS = int(os.environ.get('JOBS_EMBEDDED_THREADS', 2))
+
     # Enable debug mode.
     DEBUG = True
+
+
+class ProductionConfig(Config):
+    # Pre-forking server settings, read by gunicorn.conf.py. Every worker
+    # runs WEB_THREADS threads, so keep DB_POOL_SIZE + DB_MAX_OVERFLOW at
+    # least that large. Preloading imports the app once in the master so
+    # workers fork with it already loaded.
+    WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+    WEB_WORKERS = int(os.environ.get(
+        'WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 4))
+    WEB_PRELOAD = env_flag('WEB_PRELOAD', True)
+    WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 30))
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,177 @@
+"""Maintained upcoming/past show counters on Venue and Artist.
+
+A show counts as upcoming while its start_time is later than the
+checkpoint's rolled_at, not the wall clock: `roll_over` moves the shows
+that started since the last run from upcoming to past and advances the
+checkpoint, so every show is moved exactly once. Job workers run it every
+minute (the counters.roll entry of JOBS_SCHEDULE); a deployment without a
+worker needs `flask counters roll` in cron instead.
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, update
+
+from fyyur import db
+from fyyur.models import Artist, CounterCheckpoint, Show, Venue
+
+# (model, foreign key on Show)
+SIDES = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def _checkpoint(lock=False, read=False):
+    # writers counting shows take the row's share lock (read=True), so a
+    # concurrent roll_over, which locks it for update, waits for them to
+    # commit and they never count against a checkpoint it is moving
+    query = CounterCheckpoint.query
+    if lock:
+        query = query.with_for_update(read=read)
+    checkpoint = query.get(CounterCheckpoint.ID)
+    if checkpoint is None:
+        checkpoint = CounterCheckpoint(
+            id=CounterCheckpoint.ID, rolled_at=datetime.now())
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def _shift(model, rows, upcoming, past):
+    # rows is a subquery of (entity_id, upcoming, past) deltas
+    db.session.execute(
+        update(model).where(model.id == rows.c.entity_id).values(
+            num_upcoming_shows=model.num_upcoming_shows + upcoming,
+            num_past_shows=model.num_past_shows + past
+        ).execution_options(synchronize_session=False))
+
+
+def _grouped(key, rolled_at, *criteria):
+    is_upcoming = case((Show.start_time > rolled_at, 1), else_=0)
+    return db.session.query(
+        key.label('entity_id'),
+        func.sum(is_upcoming).label('upcoming'),
+        func.sum(1 - is_upcoming).label('past')
+    ).filter(*criteria).group_by(key).subquery()
+
+
+def record_show(show):
+    """Count a new show; call before committing the session that adds it."""
+    rolled_at = _checkpoint(lock=True, read=True).rolled_at
+    upcoming = 1 if show.start_time > rolled_at else 0
+
+    for model, entity_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        db.session.query(model).filter(model.id == entity_id).update({
+            model.num_upcoming_shows: model.num_upcoming_shows + upcoming,
+            model.num_past_shows: model.num_past_shows + 1 - upcoming
+        }, synchronize_session=False)
+
+
+def record_shows(shows, sign=1):
+    """Count a batch of new shows, given as dicts of venue_id, artist_id and
+    start_time, with one executemany per side. sign=-1 uncounts deleted
+    shows instead."""
+    rolled_at = _checkpoint(lock=True, read=True).rolled_at
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        upcoming = Counter()
+        past = Counter()
+        for show in shows:
+            if show['start_time'] > rolled_at:
+                upcoming[show[key]] += 1
+            else:
+                past[show[key]] += 1
+
+        deltas = [{'entity_id': entity_id,
+                   'upcoming': sign * upcoming[entity_id],
+                   'past': sign * past[entity_id]}
+                  for entity_id in set(upcoming) | set(past)]
+        if not deltas:
+            continue
+
+        table = model.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('entity_id')).values(
+                num_upcoming_shows=table.c.num_upcoming_shows
+                + bindparam('upcoming'),
+                num_past_shows=table.c.num_past_shows + bindparam('past')),
+            deltas)
+
+
+def forget_shows(model, entity_id):
+    """Uncount the shows of a venue or artist that is about to be deleted.
+
+    Only the other side needs updating; the deleted row takes its own
+    counters with it.
+    """
+    rolled_at = _checkpoint(lock=True, read=True).rolled_at
+    for other, key in SIDES:
+        if other is model:
+            continue
+        own_key = Show.venue_id if model is Venue else Show.artist_id
+        rows = _grouped(key, rolled_at, own_key == entity_id)
+        _shift(other, rows, -rows.c.upcoming, -rows.c.past)
+
+
+def roll_over(now=None):
+    """Move shows that started since the last run from upcoming to past."""
+    now = now or datetime.now()
+    checkpoint = _checkpoint(lock=True)
+    if now <= checkpoint.rolled_at:
+        return 0
+
+    moved = Show.query.filter(
+        Show.start_time > checkpoint.rolled_at,
+        Show.start_time <= now).count()
+    if moved:
+        for model, key in SIDES:
+            rows = db.session.query(
+                key.label('entity_id'),
+                func.count(Show.id).label('moved')
+            ).filter(
+                Show.start_time > checkpoint.rolled_at,
+                Show.start_time <= now
+            ).group_by(key).subquery()
+            _shift(model, rows, -rows.c.moved, rows.c.moved)
+
+    checkpoint.rolled_at = now
+    db.session.commit()
+    return moved
+
+
+def rebuild(now=None):
+    """Recompute every counter from the Show table."""
+    now = now or datetime.now()
+    checkpoint = _checkpoint(lock=True)
+    checkpoint.rolled_at = now
+
+    for model, key in SIDES:
+        db.session.query(model).update({
+            model.num_upcoming_shows: 0,
+            model.num_past_shows: 0
+        }, synchronize_session=False)
+        rows = _grouped(key, now)
+        _shift(model, rows, rows.c.upcoming, rows.c.past)
+    db.session.commit()
+
+
+def check():
+    """Return (model name, id, stored, actual) for every wrong counter."""
+    rolled_at = _checkpoint().rolled_at
+    mismatches = []
+
+    for model, key in SIDES:
+        rows = _grouped(key, rolled_at)
+        actual_upcoming = func.coalesce(rows.c.upcoming, 0)
+        actual_past = func.coalesce(rows.c.past, 0)
+        wrong = db.session.query(
+            model.id,
+            model.num_upcoming_shows,
+            model.num_past_shows,
+            actual_upcoming,
+            actual_past
+        ).outerjoin(rows, rows.c.entity_id == model.id).filter(
+            (model.num_upcoming_shows != actual_upcoming)
+            | (model.num_past_shows != actual_past))
+
+        for entity_id, upcoming, past, real_upcoming, real_past in wrong:
+            mismatches.append((
+                model.__name__, entity_id,
+                (upcoming, past), (real_upcoming, real_past)))
+    return mismatches
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, exc, orm
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': self.overflow(),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'max_wait_seconds': round(self.max_wait_seconds, 6),
+            }
+
+
+#----------------------------------------------------------------------------#
+# Read/write splitting.
+#----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends read-only request work to a replica.
+
+    Flushes, DML statements and anything after a write in the same
+    transaction go to the primary, as does every request of a client that
+    wrote within DB_READ_YOUR_WRITES_SECONDS.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, 'is_dml', False) or \
+                self.info.get('wrote') or not self._reads_from_replica():
+            return super().get_bind(mapper, clause)
+
+        bind = random.choice(current_app.config['DB_REPLICA_BINDS'])
+        return self.db.get_engine(self.app, bind=bind)
+
+    @staticmethod
+    def _reads_from_replica():
+        if not has_request_context():
+            return False
+        if request.method not in READ_METHODS and not g.get('db_replica'):
+            return False
+        if not current_app.config['DB_REPLICA_BINDS'] or \
+                g.get('db_primary'):
+            return False
+        return not wrote_recently()
+
+
+def wrote_recently():
+    """Whether the client wrote within DB_READ_YOUR_WRITES_SECONDS."""
+    if not has_request_context():
+        return False
+    last_write = session.get('_db_last_write')
+    window = current_app.config['DB_READ_YOUR_WRITES_SECONDS']
+    return last_write is not None and time.time() - last_write <= window
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _began(db_session, transaction, connection):
+    # the timeout is set per transaction, so it only covers request work
+    # and never a migration, CLI command or job sharing the pool; commands
+    # that need a request context set g.db_statement_timeout = 0
+    timeout = has_request_context() and g.get(
+        'db_statement_timeout', current_app.config['DB_STATEMENT_TIMEOUT_MS'])
+    if timeout:
+        connection.exec_driver_sql(
+            'SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(db_session):
+    # start this client's read-your-writes window
+    if db_session.info.pop('wrote', False) and has_request_context():
+        session['_db_last_write'] = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(db_session):
+    db_session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def use_primary(view):
+    """Keep a view on the primary even for GET requests."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_primary = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def use_replica(view):
+    """Let a read-only view read from a replica even for POST requests."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica = True
+        return view(*args, **kwargs)
+    return wrapper
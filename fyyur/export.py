@@ -0,0 +1,102 @@
+"""Streaming CSV/NDJSON export of venues, artists and shows.
+
+Rows come from a server-side (named) cursor and are written out batch by
+batch, so memory use does not depend on the size of the table.
+
+Passing a watermark exports only the rows changed since, and the updated_at
+of the last row exported is the next watermark. updated_at is stamped when
+the writing statement runs, but the row only becomes visible when its
+transaction commits, possibly after an export has already read past that
+time. So each export reaches back EXPORT_OVERLAP_SECONDS before the
+watermark. Rows near the watermark may be exported twice, and consumers
+should upsert them by id.
+
+An incremental export only contains rows that still exist: deleted venues,
+artists and shows leave nothing behind to export. A consumer mirroring the
+tables has to run a full export (no watermark) from time to time and drop
+the ids it no longer contains.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from fyyur import db
+from fyyur.models import Artist, Show, Venue
+
+FETCH_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+KINDS = ('venues', 'artists', 'shows')
+
+
+def _columns(kind):
+    if kind == 'venues':
+        return Venue, list(Venue.__table__.c)
+    if kind == 'artists':
+        return Artist, list(Artist.__table__.c)
+    return Show, list(Show.__table__.c) + [
+        Venue.name.label('venue_name'),
+        Artist.name.label('artist_name'),
+    ]
+
+
+def _statement(kind, since):
+    model, columns = _columns(kind)
+    statement = select(*columns)
+    if model is Show:
+        statement = statement.join(
+            Venue, Show.venue_id == Venue.id).join(
+            Artist, Show.artist_id == Artist.id)
+    if since is not None:
+        overlap = timedelta(
+            seconds=current_app.config['EXPORT_OVERLAP_SECONDS'])
+        statement = statement.where(model.updated_at > since - overlap)
+    return statement.order_by(model.updated_at, model.id)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export(kind, output_format='ndjson', since=None, watermark=None):
+    """Yield the export as text chunks of up to FETCH_SIZE rows.
+
+    If given, `watermark` is a dict that receives the new watermark under
+    'updated_at' once the generator is exhausted.
+    """
+    statement = _statement(kind, since)
+    # a GET request's session binds to a read replica when there is one
+    with db.session.get_bind().connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=FETCH_SIZE
+        ).execute(statement)
+        fields = list(result.keys())
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if output_format == 'csv':
+            writer.writerow(fields)
+
+        for rows in result.partitions(FETCH_SIZE):
+            for row in rows:
+                if output_format == 'csv':
+                    writer.writerow(
+                        ';'.join(value) if isinstance(value, list)
+                        else _value(value) for value in row)
+                else:
+                    buffer.write(json.dumps(
+                        {field: _value(value)
+                         for field, value in zip(fields, row)}) + '\n')
+            if watermark is not None:
+                watermark['updated_at'] = rows[-1].updated_at
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
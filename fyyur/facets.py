@@ -0,0 +1,201 @@
+"""Genre, state and city facets for browsing venues and artists.
+
+/venues/browse?genre=Jazz&state=CA lists the venues that match every
+filter. Passing several genres narrows the list to entities that have all
+of them. The genre filter is an array containment test
+(genres @> ARRAY['Jazz']), which the GIN index on the genres column serves.
+
+Each facet value shows how many entities the browse page would list after
+picking it. Genres combine, so a genre's count is the number of current
+results that also have it. Picking a state or city replaces the current
+one, so those counts ignore the place filter they would replace. A single
+GROUPING SETS aggregate over the unnested genres produces all the counts.
+It reads every entity with the chosen genres, so the counts are cached per
+filter combination. The cache is dropped whenever a venue or artist is
+created or deleted, or changes its genres, city or state.
+"""
+from flask import render_template, request, url_for
+from sqlalchemy import and_, case, distinct, func, select, true, tuple_
+
+from fyyur import db
+from fyyur.cache import ResponseCache
+from fyyur.models import Artist, Venue
+
+KINDS = {'venue': Venue, 'artist': Artist}
+
+BROWSE_RESULTS_LIMIT = 50
+# values listed per facet, largest count first
+FACET_VALUES_LIMIT = 20
+
+facet_cache = ResponseCache()
+
+
+def init_app(app):
+    facet_cache.max_entries = app.config['FACET_CACHE_SIZE']
+    facet_cache.ttl = app.config['FACET_CACHE_TTL']
+
+
+def invalidate(kind):
+    """Drop the cached facet counts of 'venue' or 'artist'."""
+    facet_cache.invalidate(f'{kind}-facets')
+
+
+def parse_filters(args):
+    return {
+        'genres': sorted({genre for genre in args.getlist('genre') if genre}),
+        'state': args.get('state') or None,
+        'city': args.get('city') or None,
+    }
+
+
+def _conditions(model, filters):
+    # the genre, state and city predicates; true() where there is no filter
+    return (
+        model.genres.contains(filters['genres'])
+        if filters['genres'] else true(),
+        model.state == filters['state'] if filters['state'] else true(),
+        model.city == filters['city'] if filters['city'] else true(),
+    )
+
+
+def browse_query(model, filters, after=None):
+    """The entities matching every filter, by name, one more row than a
+    page so the caller knows whether there is a next page."""
+    query = select(
+        model.id,
+        model.name,
+        model.city,
+        model.state,
+        model.genres,
+        model.num_upcoming_shows
+    ).where(*_conditions(model, filters))
+    if after:
+        query = query.where(model.name > after)
+    return query.order_by(model.name).limit(BROWSE_RESULTS_LIMIT + 1)
+
+
+def facet_query(model, filters):
+    """All facet counts in one statement.
+
+    Grouping by (genre), (state), (state, city) and () gives one row per
+    facet value plus the total. Every row matches the genre filter; the
+    state counts leave out the place filters and the city counts keep
+    only the state, as cities are listed within their state.
+    """
+    genre, state, city = _conditions(model, filters)
+    genres = func.unnest(model.genres).table_valued(
+        'genre').render_derived('genres').lateral()
+    entities = distinct(model.id)
+
+    return select(
+        genres.c.genre,
+        model.state,
+        model.city,
+        func.grouping(genres.c.genre).label('by_genre'),
+        func.grouping(model.state).label('by_state'),
+        func.grouping(model.city).label('by_city'),
+        case(
+            (func.grouping(model.city) == 0,
+             func.count(entities).filter(state)),
+            (func.grouping(model.state) == 0, func.count(entities)),
+            else_=func.count(entities).filter(and_(state, city))
+        ).label('count')
+    ).select_from(model).outerjoin(genres, true()).where(genre).group_by(
+        func.grouping_sets(
+            genres.c.genre,
+            model.state,
+            tuple_(model.state, model.city),
+            tuple_()))
+
+
+def _top(counts):
+    return sorted(counts, key=lambda item: (-item[-1], item[:-1]))[
+        :FACET_VALUES_LIMIT]
+
+
+def facet_counts(kind, filters):
+    key = repr((kind, filters['genres'], filters['state'], filters['city']))
+    entry = facet_cache.get(key)
+    if entry is not None:
+        return entry['body']
+
+    genres, states, cities = [], [], []
+    total = 0
+    for row in db.session.execute(facet_query(KINDS[kind], filters)):
+        if not row.count:
+            continue
+        if not row.by_genre:
+            # entities without genres still join one NULL genre row
+            if row.genre is not None:
+                genres.append((row.genre, row.count))
+        elif not row.by_city:
+            cities.append((row.city, row.state, row.count))
+        elif not row.by_state:
+            states.append((row.state, row.count))
+        else:
+            total = row.count
+
+    counts = {
+        'genres': _top(genres),
+        'states': _top(states),
+        'cities': _top(cities),
+        'total': total,
+    }
+    facet_cache.set(key, {'body': counts}, [f'{kind}-facets'])
+    return counts
+
+
+def _browse_url(kind, filters, after=None, **changes):
+    filters = dict(filters, **changes)
+    return url_for(f'{kind}s.browse_{kind}s', genre=filters['genres'],
+                   state=filters['state'], city=filters['city'], after=after)
+
+
+def browse(kind):
+    """Render the browse page of 'venue' or 'artist' for the request."""
+    filters = parse_filters(request.args)
+    after = request.args.get('after')
+    rows = db.session.execute(
+        browse_query(KINDS[kind], filters, after)).all()
+    next_url = None
+    if len(rows) > BROWSE_RESULTS_LIMIT:
+        rows = rows[:BROWSE_RESULTS_LIMIT]
+        next_url = _browse_url(kind, filters, after=rows[-1].name)
+
+    counts = facet_counts(kind, filters)
+    selected = set(filters['genres'])
+
+    def toggle(genre):
+        return sorted(selected ^ {genre})
+
+    facets = {
+        'genres': [{
+            'label': genre,
+            'count': count,
+            'selected': genre in selected,
+            'url': _browse_url(kind, filters, genres=toggle(genre)),
+        } for genre, count in counts['genres']],
+        'states': [{
+            'label': state,
+            'count': count,
+            'selected': state == filters['state'],
+            'url': _browse_url(kind, filters, state=state, city=None),
+        } for state, count in counts['states']],
+        'cities': [{
+            'label': f'{city}, {state}',
+            'count': count,
+            'selected': (city, state) == (filters['city'], filters['state']),
+            'url': _browse_url(kind, filters, state=state, city=city),
+        } for city, state, count in counts['cities']],
+    }
+
+    return render_template(
+        'pages/browse.html',
+        kind=kind,
+        results=rows,
+        total=counts['total'],
+        facets=facets,
+        filters=filters,
+        clear_url=_browse_url(kind, {'genres': [], 'state': None,
+                                     'city': None}),
+        next_url=next_url)
@@ -0,0 +1,36 @@
+from datetime import timezone
+from functools import lru_cache
+
+NAMED_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+# babel and its locale data are imported on first use rather than at startup
+
+@lru_cache(maxsize=64)
+def _compiled_pattern(format):
+    from babel.dates import parse_pattern
+    return parse_pattern(NAMED_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=16)
+def _locale(name):
+    from babel import Locale
+    return Locale.parse(name)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    """Format a datetime with a babel pattern, or a named one ('full',
+    'medium'). Strings are still accepted and parsed, but routes should
+    pass datetime objects so nothing has to be parsed back."""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    # babel treats naive datetimes as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return _compiled_pattern(format).apply(value, _locale(locale))
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template
+from fyyur.cache import cached
 from fyyur.models import Artist, Venue
 
 
@@ -9,6 +10,7 @@ home = Blueprint('home', __name__)
 # ----------------------------------------------------------------
 
 @home.route('/')
+@cached('home')
 def index():
     venues = Venue.query.order_by(Venue.id.desc()).limit(10).all()
     artists = Artist.query.order_by(Artist.id.desc()).limit(10).all()
@@ -0,0 +1,115 @@
+"""Per-request SQL instrumentation.
+
+Counts the statements each request runs, how long they take and how often
+the same statement shape repeats, and times template rendering. A shape that repeats more than
+SQL_REPEAT_THRESHOLD times in one request is almost always an N+1 loop: it
+is logged as a warning, or raised as RepeatedQueryError when
+SQL_REPEAT_RAISE is set (as in tests).
+
+Each request's timings are logged at DEBUG, or as a warning when it took
+longer than SLOW_REQUEST_MS.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import (
+    before_render_template,
+    current_app,
+    g,
+    has_request_context,
+    request,
+    template_rendered
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# '(%(id_1_1)s, %(id_1_2)s, ...)' from expanding IN parameters
+_PARAMETER_LIST = re.compile(r'\((?:\s*%\([^)]*\)s\s*,?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class RepeatedQueryError(Exception):
+    pass
+
+
+def statement_shape(statement):
+    statement = _PARAMETER_LIST.sub('(...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+    stats = g.sql_stats
+    stats['count'] += 1
+    stats['seconds'] += elapsed
+    stats['shapes'][statement_shape(statement)] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context() and 'sql_stats' in g:
+        g.render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    if has_request_context() and 'render_started' in g:
+        g.render_seconds += time.perf_counter() - g.pop('render_started')
+
+
+def _start_request():
+    g.sql_stats = {'count': 0, 'seconds': 0.0, 'shapes': Counter()}
+    g.render_seconds = 0.0
+    g.request_started = time.perf_counter()
+
+
+def _report_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - g.pop('request_started')
+    render_seconds = g.pop('render_seconds', 0.0)
+
+    threshold = current_app.config['SQL_REPEAT_THRESHOLD']
+    repeated = [(shape, count) for shape, count in stats['shapes'].items()
+                if count > threshold]
+
+    if current_app.debug:
+        response.headers['X-SQL-Queries'] = str(stats['count'])
+        response.headers['X-SQL-Time-Ms'] = f'{stats["seconds"] * 1000:.1f}'
+        response.headers['X-Render-Time-Ms'] = f'{render_seconds * 1000:.1f}'
+    # every request in debug mode; in production, where the log is
+    # error.log, only the slow ones
+    slow = elapsed * 1000 > current_app.config['SLOW_REQUEST_MS']
+    current_app.logger.log(
+        logging.WARNING if slow else logging.DEBUG,
+        '%s %s %s %.1fms sql_queries=%d sql_ms=%.1f render_ms=%.1f',
+        request.method, request.path, response.status_code, elapsed * 1000,
+        stats['count'], stats['seconds'] * 1000, render_seconds * 1000)
+
+    for shape, count in repeated:
+        message = (f'{request.method} {request.path} ran the same statement '
+                   f'{count} times: {shape[:300]}')
+        if current_app.config['SQL_REPEAT_RAISE']:
+            raise RepeatedQueryError(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_report_request)
@@ -0,0 +1,367 @@
+"""Durable background jobs for work that should not hold up a request.
+
+Jobs are rows in a local SQLite file (JOBS_DB_PATH), so they survive
+restarts and any number of `flask jobs work` processes can share one
+queue: a job is claimed inside an IMMEDIATE transaction, which SQLite
+serialises. A job that raises is retried with exponential backoff until
+it has run max_attempts times; a job whose worker died is claimed again
+once it has been running for longer than JOBS_STALE_SECONDS, or marked
+failed if that was its last attempt. Workers also
+keep one run of every job in JOBS_SCHEDULE queued, so those jobs repeat at
+their interval without cron.
+
+Route handlers enqueue and return at once:
+
+    jobs.enqueue('purge', kind='venue', entity_id=venue.id)
+"""
+import ipaddress
+import json
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from flask import current_app
+
+from fyyur import counters, db, purge
+from fyyur.models import Artist, Venue
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+'''
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+# job name -> (function, max_attempts)
+registry = {}
+
+_local = threading.local()
+
+
+def job(name, max_attempts=3):
+    """Register a function as the job `name`; it receives the keyword
+    arguments given to enqueue() and may return something JSON-able."""
+    def decorator(func):
+        registry[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def _connection(path=None):
+    # one connection per thread and file, in autocommit mode
+    path = path or current_app.config['JOBS_DB_PATH']
+    connections = _local.__dict__.setdefault('connections', {})
+    if path not in connections:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        connections[path] = connection
+    return connections[path]
+
+
+def has_worker():
+    """Whether anything consumes the queue: an embedded worker or a
+    `flask jobs work` process announced by JOBS_WORKER."""
+    config = current_app.config
+    return bool(config['JOBS_WORKER'] or config['JOBS_EMBEDDED_THREADS'])
+
+
+def enqueue(name, delay=0, **kwargs):
+    """Queue the job `name`, to run no sooner than `delay` seconds from now.
+
+    Returns the job id.
+    """
+    if name not in registry:
+        raise KeyError(f'unknown job {name!r}')
+    now = time.time()
+    cursor = _connection().execute(
+        'INSERT INTO jobs (name, kwargs, max_attempts, run_at, enqueued_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (name, json.dumps(kwargs), registry[name][1], now + delay, now))
+    return cursor.lastrowid
+
+
+def claim(path, stale_seconds):
+    """Mark the next due job as running and return it, or None."""
+    connection = _connection(path)
+    now = time.time()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        # a job that keeps killing its worker is not run forever
+        connection.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, "
+            "error = 'the worker stopped while running the job' "
+            "WHERE status = 'running' AND started_at < ? "
+            "AND attempts >= max_attempts",
+            (now, now - stale_seconds))
+        row = connection.execute(
+            "SELECT * FROM jobs WHERE (status = 'queued' AND run_at <= ?) "
+            "OR (status = 'running' AND started_at < ? "
+            "AND attempts < max_attempts) "
+            "ORDER BY run_at, id LIMIT 1",
+            (now, now - stale_seconds)).fetchone()
+        if row is not None:
+            connection.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?", (now, row['id']))
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    return row
+
+
+def schedule(path, intervals):
+    """Queue each periodic job that has no run queued or in progress, due
+    its interval from now."""
+    connection = _connection(path)
+    now = time.time()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        for name, interval in intervals.items():
+            pending = connection.execute(
+                "SELECT 1 FROM jobs WHERE name = ? "
+                "AND status IN ('queued', 'running') LIMIT 1",
+                (name,)).fetchone()
+            if pending is None:
+                connection.execute(
+                    'INSERT INTO jobs '
+                    '(name, kwargs, max_attempts, run_at, enqueued_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (name, '{}', registry[name][1], now + interval, now))
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def _run(app, row):
+    path = app.config['JOBS_DB_PATH']
+    attempts = row['attempts'] + 1
+    with app.app_context():
+        try:
+            func, _ = registry[row['name']]
+            result = func(**json.loads(row['kwargs']))
+        except BaseException:
+            db.session.rollback()
+            error = traceback.format_exc()
+            app.logger.warning('job %s (%s) failed, attempt %d of %d:\n%s',
+                               row['id'], row['name'], attempts,
+                               row['max_attempts'], error)
+            if attempts < row['max_attempts']:
+                delay = app.config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1)
+                _connection(path).execute(
+                    "UPDATE jobs SET status = 'queued', run_at = ?, "
+                    "error = ? WHERE id = ?",
+                    (time.time() + delay, error, row['id']))
+            else:
+                _connection(path).execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "error = ? WHERE id = ?",
+                    (time.time(), error, row['id']))
+        else:
+            _connection(path).execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, "
+                "result = ? WHERE id = ?",
+                (time.time(), json.dumps(result, default=str), row['id']))
+        finally:
+            db.session.remove()
+
+
+class Worker:
+    """Claims due jobs and runs them on a pool of `threads` threads."""
+
+    def __init__(self, app, threads=2, poll_interval=1.0):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        path = self.app.config['JOBS_DB_PATH']
+        stale_seconds = self.app.config['JOBS_STALE_SECONDS']
+        intervals = self.app.config['JOBS_SCHEDULE']
+        # only claim a job when a thread is free to start it
+        free = threading.Semaphore(self.threads)
+
+        with ThreadPoolExecutor(self.threads,
+                                thread_name_prefix='fyyur-job') as executor:
+            while not self.stopping.is_set():
+                free.acquire()
+                row = claim(path, stale_seconds)
+                if row is None:
+                    free.release()
+                    # idle, so a periodic job that just finished is due
+                    # to be queued again
+                    schedule(path, intervals)
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                future = executor.submit(_run, self.app, row)
+                future.add_done_callback(lambda _: free.release())
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='fyyur-jobs',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stopping.set()
+
+
+def stats(window=3600):
+    """Queue depth by status and the latency of jobs finished within the
+    last `window` seconds."""
+    connection = _connection()
+    now = time.time()
+    counts = dict(connection.execute(
+        'SELECT status, count(*) FROM jobs GROUP BY status').fetchall())
+    oldest_due = connection.execute(
+        "SELECT min(run_at) FROM jobs WHERE status = 'queued' "
+        "AND run_at <= ?", (now,)).fetchone()[0]
+
+    finished = {}
+    for row in connection.execute(
+            "SELECT name, count(*) AS jobs, "
+            "sum(status = 'failed') AS failed, "
+            "avg(started_at - enqueued_at) AS avg_wait, "
+            "avg(finished_at - started_at) AS avg_run, "
+            "max(finished_at - started_at) AS max_run "
+            "FROM jobs WHERE finished_at > ? GROUP BY name",
+            (now - window,)):
+        finished[row['name']] = {
+            'jobs': row['jobs'],
+            'failed': row['failed'],
+            'avg_wait_seconds': round(row['avg_wait'], 3),
+            'avg_run_seconds': round(row['avg_run'], 3),
+            'max_run_seconds': round(row['max_run'], 3),
+        }
+
+    return {
+        'depth': {status: counts.get(status, 0) for status in STATUSES},
+        'oldest_due_seconds': round(now - oldest_due, 3)
+        if oldest_due is not None else 0,
+        'window_seconds': window,
+        'finished': finished,
+    }
+
+
+def prune(older_than):
+    """Delete finished jobs older than `older_than` seconds."""
+    cursor = _connection().execute(
+        "DELETE FROM jobs WHERE status IN ('done', 'failed') "
+        "AND finished_at < ?", (time.time() - older_than,))
+    return cursor.rowcount
+
+
+def init_app(app):
+    threads = app.config['JOBS_EMBEDDED_THREADS']
+    if not threads:
+        return
+
+    @app.before_first_request
+    def start_embedded_worker():
+        Worker(app, threads).start()
+
+
+# ***** Jobs *****
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+
+@job('purge', max_attempts=5)
+def purge_job(kind, entity_id):
+    return {'shows_deleted': purge.purge(
+        MODELS[kind], entity_id, current_app.config['PURGE_BATCH_SIZE'])}
+
+
+@job('counters.roll')
+def roll_counters_job():
+    return {'moved': counters.roll_over()}
+
+
+@job('counters.rebuild')
+def rebuild_counters_job():
+    counters.rebuild()
+
+
+class RefusedURL(ValueError):
+    pass
+
+
+def check_public_url(url):
+    """Raise RefusedURL unless `url` is http(s) on a public address.
+
+    Image links are user input, so the worker must not read local files or
+    reach the internal network through them.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise RefusedURL(f'{url} is not an http or https link')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    for *_, address in socket.getaddrinfo(parts.hostname, port,
+                                          type=socket.SOCK_STREAM):
+        ip = ipaddress.ip_address(address[0].split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise RefusedURL(f'{parts.hostname} resolves to {ip}, '
+                             f'which is not a public address')
+
+
+@job('check_image_link')
+def check_image_link_job(kind, entity_id):
+    """Log venue and artist images whose link is broken.
+
+    HTTP errors are the answer; network errors raise and are retried.
+    Links, and every redirect they lead to, must be http(s) on a public
+    address; others are logged and not requested.
+    """
+    from urllib.error import HTTPError
+    from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+    class PublicRedirectHandler(HTTPRedirectHandler):
+        def redirect_request(self, req, fp, code, msg, headers, newurl):
+            check_public_url(newurl)
+            return super().redirect_request(
+                req, fp, code, msg, headers, newurl)
+
+    entity = MODELS[kind].query.get(entity_id)
+    if entity is None or not entity.image_link:
+        return None
+    opener = build_opener(PublicRedirectHandler)
+    try:
+        check_public_url(entity.image_link)
+        with opener.open(Request(entity.image_link, method='HEAD'),
+                         timeout=10) as response:
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    except RefusedURL as error:
+        current_app.logger.warning('%s %s image link not checked: %s',
+                                   kind, entity_id, error)
+        return {'url': entity.image_link, 'status': None,
+                'refused': str(error)}
+    except ValueError:
+        status = None
+
+    if status != 200:
+        current_app.logger.warning('%s %s has a broken image link %s (%s)',
+                                   kind, entity_id, entity.image_link, status)
+    return {'url': entity.image_link, 'status': status}
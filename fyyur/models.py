@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import DDL, String, event
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint
 from fyyur import db
 
 #----------------------------------------------------------------------------#
@@ -9,9 +9,36 @@ from fyyur import db
 #----------------------------------------------------------------------------#
 
 
+def trigram_index(table, column):
+    # GIN trigram index, usable by ILIKE '%term%' and similarity() searches
+    return db.Index(f'ix_{table}_{column}_trgm', column,
+                    postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'})
+
+
+for extension in ('pg_trgm', 'btree_gist'):
+    event.listen(
+        db.metadata, 'before_create',
+        DDL(f'CREATE EXTENSION IF NOT EXISTS {extension}').execute_if(
+            dialect='postgresql'))
+
+
+# updated_at is the export watermark (see fyyur.export). It is stamped by
+# the database clock when the statement runs, never by the clock of
+# whichever web or job process made the change.
+UTC_NOW = db.func.timezone('utc', db.func.clock_timestamp())
+
+
 # Venue Model
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        trigram_index('Venue', 'name'),
+        trigram_index('Venue', 'city'),
+        trigram_index('Venue', 'state'),
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -25,8 +52,19 @@ class Venue(db.Model):
     website = db.Column(db.String(200))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
-    shows = db.relationship('Show', backref='venues',
-                            cascade='all, delete-orphan')
+    # maintained by fyyur.counters
+    num_upcoming_shows = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
+    num_past_shows = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
+    updated_at = db.Column(
+        db.DateTime, default=UTC_NOW, onupdate=UTC_NOW,
+        server_default=db.text("(now() at time zone 'utc')"),
+        nullable=False, index=True)
+    # the database deletes the shows (ON DELETE CASCADE); they are never
+    # loaded just to be deleted
+    shows = db.relationship('Show', back_populates='venues',
+                            cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<Venue ID: {self.id}, name: {self.name}>'
@@ -35,6 +73,13 @@ class Venue(db.Model):
 # Artist Model
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        trigram_index('Artist', 'name'),
+        trigram_index('Artist', 'city'),
+        trigram_index('Artist', 'state'),
+        db.Index('ix_Artist_state_city', 'state', 'city'),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -47,8 +92,19 @@ class Artist(db.Model):
     website = db.Column(db.String(200))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
-    shows = db.relationship('Show', backref='artists',
-                            cascade='all, delete-orphan')
+    # maintained by fyyur.counters
+    num_upcoming_shows = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
+    num_past_shows = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
+    updated_at = db.Column(
+        db.DateTime, default=UTC_NOW, onupdate=UTC_NOW,
+        server_default=db.text("(now() at time zone 'utc')"),
+        nullable=False, index=True)
+    # the database deletes the shows (ON DELETE CASCADE); they are never
+    # loaded just to be deleted
+    shows = db.relationship('Show', back_populates='artists',
+                            cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<Artist ID: {self.id}, name: {self.name}>'
@@ -57,13 +113,52 @@ class Artist(db.Model):
 # Show Model
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
+        'Artist.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(
         db.DateTime, default=datetime.utcnow, nullable=False)
+    duration_minutes = db.Column(
+        db.Integer, default=120, server_default='120', nullable=False)
+    end_time = db.Column(db.DateTime, db.Computed(
+        "start_time + duration_minutes * interval '1 minute'"))
+    updated_at = db.Column(
+        db.DateTime, default=UTC_NOW, onupdate=UTC_NOW,
+        server_default=db.text("(now() at time zone 'utc')"),
+        nullable=False, index=True)
+    venues = db.relationship('Venue', back_populates='shows')
+    artists = db.relationship('Artist', back_populates='shows')
 
     def __repr__(self):
         return f'<Show ID: {self.id}, venue_id: {self.venue_id}, artist_id: {self.artist_id}>'
+
+
+# A venue cannot host two shows at overlapping times. The GiST index behind
+# the constraint also serves booking conflict and availability lookups.
+Show.__table__.append_constraint(ExcludeConstraint(
+    (Show.venue_id, '='),
+    (db.func.tsrange(Show.start_time, Show.end_time), '&&'),
+    name='ex_Show_venue_booking',
+    using='gist'))
+
+
+# Counter checkpoint: the single row records up to when show counters have
+# been rolled from upcoming to past
+class CounterCheckpoint(db.Model):
+    __tablename__ = 'CounterCheckpoint'
+
+    ID = 1
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<CounterCheckpoint rolled_at: {self.rolled_at}>'
@@ -0,0 +1,50 @@
+"""Batched deletion of venues and artists that have many shows.
+
+Deleting such a row in one statement makes the database cascade to every
+show inside a single long transaction. A purge deletes the shows
+batch_size at a time instead, each batch in its own short transaction
+together with its counter updates, and deletes the row itself once no
+shows are left. Purges run as 'purge' jobs (see fyyur.jobs), and an
+interrupted purge can simply be run again.
+"""
+from sqlalchemy import delete, select
+
+from fyyur import counters, db
+from fyyur.models import Show, Venue
+
+
+def _delete_shows(model, entity_id, limit=None):
+    # deletes the entity's shows, at most `limit` of them, and uncounts
+    # them; the caller commits
+    key = Show.venue_id if model is Venue else Show.artist_id
+    table = Show.__table__
+    batch = select(table.c.id).where(key == entity_id).limit(limit)
+    deleted = db.session.execute(
+        delete(table).where(table.c.id.in_(batch)).returning(
+            table.c.venue_id, table.c.artist_id, table.c.start_time)
+    ).mappings().all()
+    counters.record_shows(deleted, sign=-1)
+    return len(deleted)
+
+
+def purge(model, entity_id, batch_size=1000):
+    """Delete a venue or artist and its shows; returns the shows deleted."""
+    total = 0
+    while True:
+        deleted = _delete_shows(model, entity_id, batch_size)
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+
+    # Adding a show takes a key share lock on its venue and artist, so
+    # locking the row stops new shows from being added. Shows added since
+    # the last batch are then uncounted and deleted in the same transaction
+    # as the row, instead of being left to ON DELETE CASCADE.
+    db.session.query(model.id).filter(
+        model.id == entity_id).with_for_update().first()
+    total += _delete_shows(model, entity_id)
+    db.session.query(model).filter(model.id == entity_id).delete(
+        synchronize_session=False)
+    db.session.commit()
+    return total
@@ -1,20 +1,27 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, DateTimeField
-from wtforms.validators import DataRequired
+from wtforms import DateTimeField, IntegerField
+from wtforms.validators import DataRequired, InputRequired, NumberRange
 
 
 class ShowForm(FlaskForm):
-    artist_id = StringField(
+    # InputRequired, not DataRequired, so a non-numeric id is reported as
+    # such rather than as missing
+    artist_id = IntegerField(
         'artist_id',
-        validators=[DataRequired()]
+        validators=[InputRequired()]
     )
-    venue_id = StringField(
+    venue_id = IntegerField(
         'venue_id',
-        validators=[DataRequired()],
+        validators=[InputRequired()],
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[DataRequired(), NumberRange(min=15, max=24 * 60)],
+        default=120
+    )
@@ -1,41 +1,154 @@
 import sys
+from datetime import datetime, timedelta
 from flask import (
     Blueprint,
     render_template,
     url_for,
+    request,
     flash,
-    redirect
+    redirect,
+    abort
 )
-from fyyur import db
-from fyyur.models import Show
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from fyyur import counters, db
+from fyyur.cache import cached, response_cache
+from fyyur.models import Artist, Show, Venue
 from fyyur.shows.forms import ShowForm
 
 # Blueprint configuration
 shows = Blueprint('shows', __name__, url_prefix='/shows')
 
+SHOWS_PER_PAGE = 30
+MAX_SHOWS_PER_PAGE = 100
+
+# Postgres SQLSTATEs of the constraints a new show can violate
+FOREIGN_KEY_VIOLATION = '23503'
+EXCLUSION_VIOLATION = '23P01'
+
 
 # ***** Get All Shows *****
-@shows.route('/')
-def all_shows():
-    # displays list of shows at /shows
-    shows = Show.query.all()
+
+def _parse_cursor(cursor):
+    # cursors look like '<start_time isoformat>_<show id>'
+    try:
+        start_time, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (AttributeError, ValueError):
+        abort(400)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
+def shows_page_query():
+    """The statement for the page of shows the request asks for, and the
+    page size. It fetches one row more than the page size, so the caller knows
+    whether there is a next page."""
+    per_page = min(
+        request.args.get('per_page', SHOWS_PER_PAGE, type=int),
+        MAX_SHOWS_PER_PAGE)
+    if per_page < 1:
+        abort(400)
+    when = request.args.get('when', 'all')
+    if when not in ('all', 'upcoming', 'past'):
+        abort(400)
+
+    query = select(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id)
+
+    now = datetime.now()
+    if when == 'upcoming':
+        query = query.where(Show.start_time > now)
+    elif when == 'past':
+        query = query.where(Show.start_time <= now)
+
+    date_from = request.args.get('from')
+    if date_from:
+        query = query.where(Show.start_time >= _parse_date(date_from))
+    date_to = request.args.get('to')
+    if date_to:
+        query = query.where(
+            Show.start_time < _parse_date(date_to) + timedelta(days=1))
+
+    # past shows are listed most recent first
+    descending = when == 'past'
+    after = request.args.get('after')
+    if after:
+        cursor = tuple_(Show.start_time, Show.id)
+        position = tuple_(*_parse_cursor(after))
+        query = query.where(
+            cursor < position if descending else cursor > position)
+
+    if descending:
+        query = query.order_by(Show.start_time.desc(), Show.id.desc())
+    else:
+        query = query.order_by(Show.start_time, Show.id)
+
+    return query.limit(per_page + 1), per_page
+
+
+def render_shows_page(rows, per_page):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = f'{last.start_time.isoformat()}_{last.id}'
+
     data = []
 
-    for show in shows:
+    for show in rows:
         show_info = {
-            'venue_id': show.venues.id,
-            'venue_name': show.venues.name,
-            'artist_id': show.artists.id,
-            'artist_name': show.artists.name,
-            'artist_image_link': show.artists.image_link,
-            'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'artist_image_link': show.artist_image_link,
+            'start_time': show.start_time
         }
 
         data.append(show_info)
-    return render_template('pages/shows.html', shows=data)
+
+    next_url = None
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        next_url = url_for('shows.all_shows', **args)
+    return render_template('pages/shows.html', shows=data, next_url=next_url)
+
+
+@shows.route('/')
+@cached('shows')
+def all_shows():
+    # displays a page of shows at /shows, using keyset pagination on
+    # (start_time, id) so that deep pages cost the same as the first one
+    query, per_page = shows_page_query()
+    return render_shows_page(db.session.execute(query).all(), per_page)
+
 
 # ***** Create a Show *****
 
+def venue_is_booked(venue_id, start_time, end_time):
+    # same overlap test as the ex_Show_venue_booking constraint, so it is
+    # answered from the constraint's GiST index
+    return db.session.query(Show.query.filter(
+        Show.venue_id == venue_id,
+        func.tsrange(Show.start_time, Show.end_time).op('&&')(
+            func.tsrange(start_time, end_time))
+    ).exists()).scalar()
+
 
 @shows.route('/create')
 def create_shows():
@@ -50,18 +163,50 @@ def create_show_submission():
     form = ShowForm()
 
     if form.validate_on_submit():
+        start_time = form.start_time.data
+        end_time = start_time + timedelta(minutes=form.duration_minutes.data)
+
         try:
+            if venue_is_booked(form.venue_id.data, start_time, end_time):
+                flash('The venue already has a show booked at that time.',
+                      'danger')
+                return render_template('forms/new_show.html', form=form)
+
             show = Show(
                 artist_id=form.artist_id.data,
                 venue_id=form.venue_id.data,
-                start_time=form.start_time.data
+                start_time=start_time,
+                duration_minutes=form.duration_minutes.data
             )
             # Adding the show to the database and committing it.
             db.session.add(show)
+            db.session.flush()
+            counters.record_show(show)
             db.session.commit()
+            response_cache.invalidate(
+                'shows', 'venues', f'venue:{show.venue_id}',
+                f'artist:{show.artist_id}')
 
             flash('Show was successfully listed!', 'success')
             return redirect(url_for('home.index'))
+        except IntegrityError as error:
+            db.session.rollback()
+            if error.orig.pgcode == EXCLUSION_VIOLATION:
+                # a concurrent booking won the race for the same slot
+                flash('The venue already has a show booked at that time.',
+                      'danger')
+            elif error.orig.pgcode == FOREIGN_KEY_VIOLATION:
+                if error.orig.diag.constraint_name == 'Show_venue_id_fkey':
+                    flash(f'There is no venue with ID {form.venue_id.data}.',
+                          'danger')
+                else:
+                    flash(f'There is no artist with ID {form.artist_id.data}.',
+                          'danger')
+            else:
+                print(sys.exc_info())
+                flash('An error occurred. Show could not be listed.',
+                      'danger')
+            return render_template('forms/new_show.html', form=form)
         except BaseException:
             db.session.rollback()
             print(sys.exc_info())
@@ -71,3 +216,4 @@ def create_show_submission():
             db.session.close()
     else:
         flash('An error occurred. Show could not be listed.', 'danger')
+        return render_template('forms/new_show.html', form=form)
@@ -2,3 +2,26 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  input.addEventListener('input', function () {
+    var term = input.value;
+    if (!term) {
+      return;
+    }
+    fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(term))
+      .then(function (response) { return response.json(); })
+      .then(function (body) {
+        if (input.value !== term) {
+          return;
+        }
+        list.innerHTML = '';
+        body.data.forEach(function (suggestion) {
+          var option = document.createElement('option');
+          option.value = suggestion.name;
+          list.appendChild(option);
+        });
+      });
+  });
+});
@@ -1,21 +1,32 @@
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
 from flask import (
     Blueprint,
+    current_app,
     render_template,
     url_for,
     request,
     flash,
-    redirect
+    redirect,
+    jsonify,
+    abort
 )
-from sqlalchemy import or_
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.orm import selectinload
 from fyyur.models import Show, Venue
-from fyyur import db
+from fyyur import counters, db, facets, jobs, purge
+from fyyur.autocomplete import venue_index
+from fyyur.cache import add_tags, cached, response_cache
+from fyyur.database import use_primary, use_replica
 from fyyur.venues.forms import VenueForm
 
 # Blueprint configuration
 venues = Blueprint('venues', __name__, url_prefix='/venues')
 
+SEARCH_RESULTS_LIMIT = 50
+
 
 # ***** Create a New Venue *****
 
@@ -47,6 +58,12 @@ def create_venue_submission():
 
             db.session.add(venue)
             db.session.commit()
+            venue_index.add(venue.id, venue.name)
+            if venue.image_link and jobs.has_worker():
+                jobs.enqueue('check_image_link', kind='venue',
+                             entity_id=venue.id)
+            response_cache.invalidate('home', 'venues')
+            facets.invalidate('venue')
 
             flash(
                 f'Venue {form.name.data} was successfully listed!', 'success')
@@ -69,60 +86,76 @@ def create_venue_submission():
 
 # ***** Get All Venues *****
 
-@venues.route('/')
-def all_venues():
-    # Get the distinct values for city and state
-    venues = Venue.query.distinct(Venue.city, Venue.state).all()
-
-    all_data = []
-
-    for venue in venues:
-        venue_data = {
-            'city': venue.city,
-            'state': venue.state
-        }
+def venue_areas_query():
+    # every venue with its maintained upcoming show counter, ordered so
+    # that venues of the same area are adjacent
+    return select(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.num_upcoming_shows,
+        Venue.updated_at
+    ).order_by(Venue.state, Venue.city, Venue.name)
 
-        upcoming_shows = db.session.query(Show).join(Venue).filter(
-            Show.venue_id == venue.id).filter(Show.start_time > datetime.now()).all()
 
-        # filter the database using the distinct city and state
-        res = Venue.query.filter_by(city=venue.city, state=venue.state).all()
+def render_venue_areas(rows):
+    all_data = []
 
-        venue_details = []
+    for (city, state), area_venues in groupby(
+            rows, key=lambda row: (row.city, row.state)):
+        area_venues = list(area_venues)
+        all_data.append({
+            'city': city,
+            'state': state,
+            # the cached area fragment is rendered again once a venue is
+            # added, changed (counters included) or removed
+            'version': '{}:{}'.format(
+                len(area_venues),
+                max(row.updated_at for row in area_venues).isoformat()),
+            'venues': [{
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in area_venues]
+        })
+    return render_template('pages/venues.html', areas=all_data)
 
-        for data in res:
-            venue_details.append({
-                'id': data.id,
-                'name': data.name,
-                'num_upcoming_shows': len(upcoming_shows)
-            })
 
-        venue_data['venues'] = venue_details
-        all_data.append(venue_data)
-    return render_template('pages/venues.html', areas=all_data)
+@venues.route('/')
+@cached('venues')
+def all_venues():
+    return render_venue_areas(
+        db.session.execute(venue_areas_query()).all())
 
 
 # ***** Search Venue *****
 
-@venues.route('/search', methods=['POST'])
-def search_venues():
-    search_term = request.form.get('search_term', '')
-    venues = Venue.query.filter(or_(
+def venue_search_query(search_term):
+    # the ILIKE predicates are served by the trigram indexes on Venue;
+    # hits are ranked by name similarity and capped at SEARCH_RESULTS_LIMIT
+    return select(
+        Venue.id,
+        Venue.name,
+        Venue.num_upcoming_shows
+    ).where(or_(
         Venue.name.ilike(f'%{search_term}%'),
         Venue.city.ilike(f'{search_term}'),
         Venue.state.ilike(f'{search_term}')
-    )).all()
+    )).order_by(
+        func.similarity(Venue.name, search_term).desc(),
+        Venue.name
+    ).limit(SEARCH_RESULTS_LIMIT)
+
 
+def render_venue_search(venues, search_term):
     data = []
 
     for venue in venues:
-        upcoming_shows = db.session.query(Show).join(Venue).filter(
-            Show.venue_id == venue.id).filter(Show.start_time > datetime.now()).all()
-
         data.append({
             'id': venue.id,
             'name': venue.name,
-            'num_upcoming_shows': len(upcoming_shows)
+            'num_upcoming_shows': venue.num_upcoming_shows
         })
     response = {
         "count": len(venues),
@@ -131,58 +164,153 @@ def search_venues():
     return render_template(
         'pages/search_venues.html',
         results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
+        search_term=search_term)
 
 
-# ***** Get a Single Venue by ID *****
-
-@venues.route('/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    venue = Venue.query.get_or_404(venue_id)
-
-    upcoming_show_artist_details = []
-    past_show_artist_details = []
+@venues.route('/search', methods=['POST'])
+@use_replica
+def search_venues():
+    search_term = request.form.get('search_term', '')
+    return render_venue_search(
+        db.session.execute(venue_search_query(search_term)).all(),
+        search_term)
+
+
+# ***** Browse Venues by Genre and Place *****
+
+@venues.route('/browse')
+def browse_venues():
+    # ?genre=Jazz&state=CA, with the facet counts of fyyur.facets
+    return facets.browse('venue')
+
+
+# ***** Autocomplete Venue Names *****
+
+@venues.route('/autocomplete')
+def autocomplete_venues():
+    # answered from the in-memory prefix index, never from the database
+    suggestions = venue_index.search(request.args.get('q', ''))
+    return jsonify(data=suggestions)
+
+
+# ***** Venue Availability *****
+
+# Free slots of many venues in one statement: the shows overlapping the
+# window are found through the GiST booking index, and a running max over
+# each venue's busy intervals turns them into the gaps between bookings.
+AVAILABILITY_QUERY = text("""
+    WITH candidate AS (
+        SELECT id FROM "Venue"
+        WHERE id > :after
+          AND (:city IS NULL OR city = :city)
+          AND (:state IS NULL OR state = :state)
+        ORDER BY id
+        LIMIT :limit
+    ),
+    edges AS (
+        SELECT id AS venue_id, CAST(:start AS timestamp) AS busy_from,
+               CAST(:start AS timestamp) AS busy_to
+        FROM candidate
+        UNION ALL
+        SELECT s.venue_id, s.start_time, s.end_time
+        FROM "Show" s JOIN candidate c ON c.id = s.venue_id
+        WHERE tsrange(s.start_time, s.end_time) && tsrange(:start, :end)
+        UNION ALL
+        SELECT id, CAST(:end AS timestamp), CAST(:end AS timestamp)
+        FROM candidate
+    ),
+    gaps AS (
+        SELECT venue_id,
+               greatest(max(busy_to) OVER (
+                   PARTITION BY venue_id ORDER BY busy_from, busy_to
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ), CAST(:start AS timestamp)) AS free_from,
+               least(busy_from, CAST(:end AS timestamp)) AS free_to
+        FROM edges
+    )
+    SELECT g.venue_id, v.name, g.free_from, g.free_to
+    FROM gaps g JOIN "Venue" v ON v.id = g.venue_id
+    WHERE g.free_to - g.free_from >= :min_gap
+    ORDER BY g.venue_id, g.free_from
+""")
+
+AVAILABILITY_VENUE_LIMIT = 200
+
+
+@venues.route('/availability')
+def venue_availability():
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        abort(400)
+    min_minutes = request.args.get('min_minutes', 60, type=int)
+    if end <= start or min_minutes < 1:
+        abort(400)
+
+    rows = db.session.execute(AVAILABILITY_QUERY, {
+        'start': start,
+        'end': end,
+        'min_gap': timedelta(minutes=min_minutes),
+        'city': request.args.get('city'),
+        'state': request.args.get('state'),
+        'after': request.args.get('after', 0, type=int),
+        'limit': AVAILABILITY_VENUE_LIMIT
+    })
 
-    past_shows = db.session.query(Show).join(Venue).filter(
-        Show.venue_id == venue_id).filter(Show.start_time < datetime.now()).all()
+    data = []
+    for (venue_id, name), slots in groupby(
+            rows, key=lambda row: (row.venue_id, row.name)):
+        data.append({
+            'venue_id': venue_id,
+            'venue_name': name,
+            'free_slots': [{
+                'start': slot.free_from.isoformat(),
+                'end': slot.free_to.isoformat()
+            } for slot in slots]
+        })
+    return jsonify(data=data)
 
-    upcoming_shows = db.session.query(Show).join(Venue).filter(
-        Show.venue_id == venue_id).filter(Show.start_time > datetime.now()).all()
 
-    setattr(venue, 'upcoming_shows', upcoming_shows)
-    setattr(venue, 'upcoming_shows_count', len(upcoming_shows))
-    setattr(venue, 'past_shows', past_shows)
-    setattr(venue, 'past_shows_count', len(past_shows))
+# ***** Get a Single Venue by ID *****
 
-    for show in venue.upcoming_shows:
-        artist_details = {}
+def render_venue(venue, upcoming_shows, past_shows):
+    venue.upcoming_shows = upcoming_shows
+    venue.upcoming_shows_count = len(upcoming_shows)
+    venue.past_shows = past_shows
+    venue.past_shows_count = len(past_shows)
+    return render_template('pages/show_venue.html', venue=venue)
 
-        artist_details['artist_id'] = show.artist_id
-        artist_details['artist_name'] = show.artists.name
-        artist_details['artist_image_link'] = show.artists.image_link
-        artist_details['start_time'] = show.start_time.strftime(
-            '%Y-%m-%d %H:%M:%S')
 
-        upcoming_show_artist_details.append(artist_details)
+@venues.route('/<int:venue_id>')
+@cached('venue:{venue_id}')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id; the venue, its shows
+    # and their artists are loaded in two queries however many shows exist
+    venue = Venue.query.options(
+        selectinload(Venue.shows).joinedload(Show.artists)
+    ).filter_by(id=venue_id).first_or_404()
 
-    venue.upcoming_shows = upcoming_show_artist_details
+    now = datetime.now()
+    upcoming_show_artist_details = []
+    past_show_artist_details = []
 
-    for show in venue.past_shows:
+    for show in sorted(venue.shows, key=attrgetter('start_time')):
+        add_tags(f'artist:{show.artist_id}')
         artist_details = {}
 
         artist_details['artist_id'] = show.artist_id
         artist_details['artist_name'] = show.artists.name
         artist_details['artist_image_link'] = show.artists.image_link
-        artist_details['start_time'] = show.start_time.strftime(
-            '%Y-%m-%d %H:%M:%S')
+        artist_details['start_time'] = show.start_time
 
-        past_show_artist_details.append(artist_details)
+        if show.start_time > now:
+            upcoming_show_artist_details.append(artist_details)
+        else:
+            past_show_artist_details.append(artist_details)
 
-    venue.past_shows = past_show_artist_details
-    return render_template('pages/show_venue.html', venue=venue)
+    return render_venue(
+        venue, upcoming_show_artist_details, past_show_artist_details)
 
 
 # ***** Update Venue *****
@@ -219,6 +347,7 @@ def edit_venue_submission(venue_id):
     venue = Venue.query.get_or_404(venue_id)
     if form.validate_on_submit():
         try:
+            faceted = (venue.genres, venue.city, venue.state)
             venue.name = form.name.data
             venue.city = form.city.data
             venue.state = form.state.data
@@ -230,9 +359,18 @@ def edit_venue_submission(venue_id):
             venue.website = form.website_link.data
             venue.seeking_talent = form.seeking_talent.data
             venue.seeking_description = form.seeking_description.data
+            faceted = faceted != (venue.genres, venue.city, venue.state)
 
             db.session.add(venue)
             db.session.commit()
+            venue_index.add(venue.id, venue.name)
+            if venue.image_link and jobs.has_worker():
+                jobs.enqueue('check_image_link', kind='venue',
+                             entity_id=venue.id)
+            response_cache.invalidate(
+                'home', 'venues', 'shows', f'venue:{venue_id}')
+            if faceted:
+                facets.invalidate('venue')
 
             flash(f'Venue {venue.name} was updated successfully!', 'success')
             return redirect(url_for('venues.show_venue', venue_id=venue_id))
@@ -252,11 +390,37 @@ def edit_venue_submission(venue_id):
 # ***** Delete Venue *****
 
 @venues.route('/<int:venue_id>/delete', methods=['GET', 'POST'])
+@use_primary
 def delete_venue(venue_id):
     venue = Venue.query.get_or_404(venue_id)
+    # forgetting the shows changes the counters of every artist who played
+    artist_tags = [f'artist:{artist_id}' for artist_id, in db.session.query(
+        Show.artist_id).filter(Show.venue_id == venue.id).distinct()]
+    tags = ('home', 'venues', 'artists', 'shows', f'venue:{venue_id}',
+            *artist_tags)
+    large = venue.num_upcoming_shows + venue.num_past_shows > \
+        current_app.config['PURGE_INLINE_LIMIT']
+    if large and jobs.has_worker():
+        jobs.enqueue('purge', kind='venue', entity_id=venue.id)
+        venue_index.remove(venue_id)
+        response_cache.invalidate(*tags)
+        facets.invalidate('venue')
+
+        flash('Venue is being deleted in the background', 'success')
+        return redirect(url_for('home.index'))
+
     try:
-        db.session.delete(venue)
-        db.session.commit()
+        if large:
+            # nothing runs queued jobs, so purge in batches right here
+            purge.purge(Venue, venue.id,
+                        current_app.config['PURGE_BATCH_SIZE'])
+        else:
+            counters.forget_shows(Venue, venue.id)
+            db.session.delete(venue)
+            db.session.commit()
+        venue_index.remove(venue_id)
+        response_cache.invalidate(*tags)
+        facets.invalidate('venue')
 
         flash('Venue deleted successfully', 'success')
         return redirect(url_for('home.index'))
@@ -0,0 +1,27 @@
+"""gunicorn settings, taken from the production profile.
+
+    SECRET_KEY=... gunicorn -c gunicorn.conf.py wsgi:app
+
+WEB_CONCURRENCY, WEB_THREADS, WEB_PRELOAD, WEB_BIND and WEB_TIMEOUT
+override the defaults; see ProductionConfig.
+"""
+from fyyur.config import ProductionConfig
+
+bind = ProductionConfig.WEB_BIND
+workers = ProductionConfig.WEB_WORKERS
+threads = ProductionConfig.WEB_THREADS
+worker_class = 'gthread'
+preload_app = ProductionConfig.WEB_PRELOAD
+timeout = ProductionConfig.WEB_TIMEOUT
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # connections the master opened while preloading must not be shared by
+    # the forked workers
+    from fyyur import db
+    from wsgi import app
+
+    with app.app_context():
+        for bind in [None] + list(app.config['SQLALCHEMY_BINDS']):
+            db.get_engine(app, bind=bind).dispose()
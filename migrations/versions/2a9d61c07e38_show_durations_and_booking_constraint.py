@@ -0,0 +1,36 @@
+"""show durations and venue double-booking constraint
+
+Revision ID: 2a9d61c07e38
+Revises: f7c2d9e41a55
+Create Date: 2022-07-04 16:20:45.918263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a9d61c07e38'
+down_revision = 'f7c2d9e41a55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(),
+                                    server_default='120', nullable=False))
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), sa.Computed(
+        "start_time + duration_minutes * interval '1 minute'")))
+    # fails if the venue already has overlapping bookings; resolve those
+    # before upgrading
+    op.execute('''
+        ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_booking"
+        EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)
+    ''')
+
+
+def downgrade():
+    op.drop_constraint('ex_Show_venue_booking', 'Show')
+    op.drop_column('Show', 'end_time')
+    op.drop_column('Show', 'duration_minutes')
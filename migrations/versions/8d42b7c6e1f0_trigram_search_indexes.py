@@ -0,0 +1,40 @@
+"""trigram search indexes on venue and artist
+
+Revision ID: 8d42b7c6e1f0
+Revises: 3c1f5e0a9b21
+Create Date: 2022-06-09 18:41:53.208117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d42b7c6e1f0'
+down_revision = '3c1f5e0a9b21'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_COLUMNS = ('name', 'city', 'state')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for table in ('Venue', 'Artist'):
+            for column in TRIGRAM_COLUMNS:
+                op.create_index(
+                    f'ix_{table}_{column}_trgm', table, [column],
+                    postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'},
+                    postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('Venue', 'Artist'):
+            for column in TRIGRAM_COLUMNS:
+                op.drop_index(
+                    f'ix_{table}_{column}_trgm', table_name=table,
+                    postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""cascade show deletes in the database
+
+Revision ID: 9e4b1d7a2c60
+Revises: 2a9d61c07e38
+Create Date: 2022-07-06 10:12:31.402871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b1d7a2c60'
+down_revision = '2a9d61c07e38'
+branch_labels = None
+depends_on = None
+
+
+def _replace_foreign_keys(ondelete):
+    for column, table in (('venue_id', 'Venue'), ('artist_id', 'Artist')):
+        name = f'Show_{column}_fkey'
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', table, [column], ['id'],
+                              ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
@@ -0,0 +1,42 @@
+"""hot path indexes on show, venue and artist
+
+Revision ID: b5e93a07d4c2
+Revises: 8d42b7c6e1f0
+Create Date: 2022-06-14 09:26:40.871203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e93a07d4c2'
+down_revision = '8d42b7c6e1f0'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], {}),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], {}),
+    ('ix_Show_start_time_id', 'Show', ['start_time', 'id'], {}),
+    ('ix_Venue_state_city', 'Venue', ['state', 'city'], {}),
+    ('ix_Artist_state_city', 'Artist', ['state', 'city'], {}),
+    ('ix_Venue_genres', 'Venue', ['genres'], {'postgresql_using': 'gin'}),
+    ('ix_Artist_genres', 'Artist', ['genres'], {'postgresql_using': 'gin'}),
+)
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes build, but
+    # cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns,
+                            postgresql_concurrently=True, **options)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True)
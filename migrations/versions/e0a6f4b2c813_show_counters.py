@@ -0,0 +1,55 @@
+"""upcoming and past show counters on venue and artist
+
+Revision ID: e0a6f4b2c813
+Revises: b5e93a07d4c2
+Create Date: 2022-06-20 14:03:12.334810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e0a6f4b2c813'
+down_revision = 'b5e93a07d4c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('CounterCheckpoint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('num_upcoming_shows', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('num_past_shows', sa.Integer(),
+                                       server_default='0', nullable=False))
+
+    op.execute('INSERT INTO "CounterCheckpoint" (id, rolled_at) '
+               'VALUES (1, LOCALTIMESTAMP)')
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" t SET
+                num_upcoming_shows = c.upcoming,
+                num_past_shows = c.past
+            FROM (
+                SELECT s.{key} AS id,
+                       count(*) FILTER (WHERE s.start_time > cp.rolled_at)
+                           AS upcoming,
+                       count(*) FILTER (WHERE s.start_time <= cp.rolled_at)
+                           AS past
+                FROM "Show" s, "CounterCheckpoint" cp
+                GROUP BY s.{key}
+            ) c
+            WHERE t.id = c.id
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'num_past_shows')
+        op.drop_column(table, 'num_upcoming_shows')
+    op.drop_table('CounterCheckpoint')
@@ -0,0 +1,38 @@
+"""updated_at on venue, artist and show for incremental exports
+
+Revision ID: f7c2d9e41a55
+Revises: e0a6f4b2c813
+Create Date: 2022-06-27 11:52:30.104482
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2d9e41a55'
+down_revision = 'e0a6f4b2c813'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("(now() at time zone 'utc')")))
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(f'ix_{table}_updated_at', table, ['updated_at'],
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(f'ix_{table}_updated_at', table_name=table,
+                          postgresql_concurrently=True)
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
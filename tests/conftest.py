@@ -0,0 +1,112 @@
+"""Fixtures for the tests, which run against throwaway PostgreSQL databases.
+
+FYYUR_TEST_DATABASE_URL names the database used as the primary. The read
+replica tests also need FYYUR_TEST_REPLICA_URL, a second database that
+stands in for a replica. Every test creates the tables it needs and drops
+them afterwards, so never point these at real data. A test whose database
+is not configured is skipped.
+
+    createdb fyyur_test && createdb fyyur_test_replica
+    export FYYUR_TEST_DATABASE_URL=postgresql://postgres@localhost/fyyur_test
+    export FYYUR_TEST_REPLICA_URL=postgresql://postgres@localhost/fyyur_test_replica
+    python -m pytest
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+# read by fyyur.config on import: tests run jobs themselves, if at all
+os.environ['JOBS_EMBEDDED_THREADS'] = '0'
+
+from fyyur import create_app, db  # noqa: E402
+from fyyur.models import Artist, Show, Venue  # noqa: E402
+
+PRIMARY_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+REPLICA_URL = os.environ.get('FYYUR_TEST_REPLICA_URL')
+
+requires_database = pytest.mark.skipif(
+    not PRIMARY_URL, reason='FYYUR_TEST_DATABASE_URL is not set')
+requires_replica = pytest.mark.skipif(
+    not (PRIMARY_URL and REPLICA_URL),
+    reason='FYYUR_TEST_DATABASE_URL and FYYUR_TEST_REPLICA_URL are not set')
+
+
+def _make_app(tmp_path, replica_url=None):
+    app = create_app('development')
+    binds = {'replica_0': replica_url} if replica_url else {}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        RESPONSE_CACHE_ENABLED=False,
+        FRAGMENT_CACHE_ENABLED=False,
+        SQL_REPEAT_RAISE=True,
+        SQLALCHEMY_DATABASE_URI=PRIMARY_URL,
+        SQLALCHEMY_BINDS=binds,
+        DB_REPLICA_BINDS=sorted(binds),
+        JOBS_DB_PATH=str(tmp_path / 'jobs.sqlite3'),
+    )
+    return app
+
+
+def _engines(app):
+    # the primary, then every replica; the models have no bind key, so
+    # each database gets the full schema
+    return [db.get_engine(app)] + [
+        db.get_engine(app, bind) for bind in app.config['DB_REPLICA_BINDS']]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = _make_app(tmp_path)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    app = _make_app(tmp_path, REPLICA_URL)
+    with app.app_context():
+        for engine in _engines(app):
+            db.Model.metadata.create_all(bind=engine)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in _engines(app):
+            db.Model.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def venue(number, **columns):
+    return Venue(**dict({
+        'name': f'Venue {number}',
+        'city': 'Springfield',
+        'state': 'CA',
+        'address': f'{number} Main Street',
+        'phone': '4155550100',
+        'genres': ['Jazz'],
+    }, **columns))
+
+
+def artist(number, **columns):
+    return Artist(**dict({
+        'name': f'Artist {number}',
+        'city': 'Springfield',
+        'state': 'CA',
+        'phone': '4155550100',
+        'genres': ['Jazz'],
+        'image_link': f'https://img.example.com/artists/{number}.jpg',
+    }, **columns))
+
+
+def show(venue, artist, days_from_now):
+    return Show(venues=venue, artists=artist,
+                start_time=datetime.now() + timedelta(days=days_from_now))
@@ -0,0 +1,125 @@
+"""Read/write splitting between a primary and a replica database.
+
+Nothing replicates between the two test databases, so where a row shows
+up tells which database a statement went to.
+"""
+
+from fyyur import db
+from fyyur.cache import response_cache
+from fyyur.models import Venue
+from tests.conftest import requires_replica, venue
+
+NEW_VENUE = {
+    'name': 'Venue 3',
+    'city': 'Springfield',
+    'state': 'CA',
+    'address': '3 Main Street',
+    'phone': '4155550100',
+    'genres': 'Jazz',
+    'facebook_link': 'https://facebook.com/venue3',
+}
+
+
+def _seed(app):
+    with app.app_context():
+        db.session.add(venue(1))
+        db.session.commit()
+        replica = db.get_engine(app, 'replica_0')
+        with replica.begin() as connection:
+            connection.execute(Venue.__table__.insert(), {
+                'name': 'Venue 2', 'city': 'Springfield', 'state': 'CA',
+                'address': '2 Main Street', 'phone': '4155550100',
+                'genres': ['Jazz']})
+
+
+def _names(app, bind=None):
+    with app.app_context():
+        engine = db.get_engine(app, bind)
+        with engine.connect() as connection:
+            return {name for name, in connection.execute(
+                Venue.__table__.select().with_only_columns(
+                    Venue.__table__.c.name))}
+
+
+@requires_replica
+def test_get_requests_read_from_the_replica(replicated_app):
+    _seed(replicated_app)
+    page = replicated_app.test_client().get('/venues/').get_data(as_text=True)
+
+    assert 'Venue 2' in page
+    assert 'Venue 1' not in page
+
+
+@requires_replica
+def test_posts_write_to_the_primary(replicated_app):
+    _seed(replicated_app)
+    response = replicated_app.test_client().post(
+        '/venues/create', data=NEW_VENUE)
+
+    assert response.status_code == 302
+    assert 'Venue 3' in _names(replicated_app)
+    assert 'Venue 3' not in _names(replicated_app, 'replica_0')
+
+
+@requires_replica
+def test_searches_read_from_the_replica(replicated_app):
+    _seed(replicated_app)
+    page = replicated_app.test_client().post(
+        '/venues/search', data={'search_term': 'Venue'}).get_data(as_text=True)
+
+    assert 'Venue 2' in page
+    assert 'Venue 1' not in page
+
+
+@requires_replica
+def test_flush_in_a_get_request_goes_to_the_primary(replicated_app):
+    _seed(replicated_app)
+    with replicated_app.test_request_context('/venues/'):
+        replica = db.get_engine(replicated_app, 'replica_0')
+        assert db.session.get_bind() is replica
+
+        db.session.add(venue(4))
+        db.session.flush()
+        assert db.session.get_bind() is db.get_engine(replicated_app)
+        db.session.commit()
+
+    assert 'Venue 4' in _names(replicated_app)
+    assert 'Venue 4' not in _names(replicated_app, 'replica_0')
+
+
+@requires_replica
+def test_reads_after_a_write_go_to_the_primary(replicated_app):
+    _seed(replicated_app)
+    client = replicated_app.test_client()
+    client.post('/venues/create', data=NEW_VENUE)
+
+    # within DB_READ_YOUR_WRITES_SECONDS the client sees its own write
+    page = client.get('/venues/').get_data(as_text=True)
+    assert 'Venue 3' in page
+    assert 'Venue 2' not in page
+
+    # once the window has passed, reads go back to the replica
+    with client.session_transaction() as client_session:
+        client_session['_db_last_write'] -= \
+            replicated_app.config['DB_READ_YOUR_WRITES_SECONDS'] + 1
+    page = client.get('/venues/').get_data(as_text=True)
+    assert 'Venue 2' in page
+    assert 'Venue 3' not in page
+
+
+@requires_replica
+def test_writers_are_not_served_cached_replica_pages(replicated_app):
+    _seed(replicated_app)
+    replicated_app.config['RESPONSE_CACHE_ENABLED'] = True
+    response_cache.clear()
+    writer = replicated_app.test_client()
+    # following the redirect shows the flash, which would skip the cache
+    writer.post('/venues/create', data=NEW_VENUE, follow_redirects=True)
+
+    # another client caches the listing as the lagging replica has it
+    page = replicated_app.test_client().get('/venues/').get_data(as_text=True)
+    assert 'Venue 3' not in page
+
+    page = writer.get('/venues/').get_data(as_text=True)
+    assert 'Venue 3' in page
+    response_cache.clear()
@@ -0,0 +1,39 @@
+from fyyur import counters, db
+from tests.conftest import artist, requires_database, show, venue
+
+
+def _seed(areas, venues_per_area, first=0):
+    performer = artist(first)
+    number = first
+    for area in range(areas):
+        for _ in range(venues_per_area):
+            number += 1
+            place = venue(number, city=f'City {first + area}')
+            db.session.add_all([place, show(place, performer, 7),
+                                show(place, performer, -7)])
+    db.session.commit()
+    counters.rebuild()
+
+
+def _queries(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return int(response.headers['X-SQL-Queries']), response.get_data(
+        as_text=True)
+
+
+@requires_database
+def test_venue_listing_query_count_does_not_grow_with_venues(app, client):
+    with app.app_context():
+        _seed(areas=2, venues_per_area=2)
+    # the first request also builds the autocomplete indexes
+    client.get('/venues/')
+    few, _ = _queries(client, '/venues/')
+
+    with app.app_context():
+        _seed(areas=20, venues_per_area=5, first=1000)
+    many, page = _queries(client, '/venues/')
+
+    assert many == few
+    assert 'City 1019' in page
+    assert 'Venue 1100' in page
@@ -0,0 +1,7 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+
+from fyyur import create_app
+
+
+app = create_app(os.environ.get('FYYUR_CONFIG', 'production'))